@@ -1,5 +1,4 @@
 """Blinky: Main contributor to FlaschPlayer"""
-import glob
 import importlib
 import logging
 import os
@@ -7,22 +6,32 @@ import random
 import sys
 import threading
 import time
-from collections.abc import Generator, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import cast
 
+import numpy as np
 from apscheduler.schedulers.background import BackgroundScheduler
-from PIL import Image, ImageSequence
 
+import control
 import display as d
+import frame_cache
+import notify
+import overlay
+import playback
 from display import Display
 import text_queue as txt_q
 import thequeue as q
+import video
 from config import Constants, Main_Options as Options
+from durable_queue import QueueFull
+from frame_cache import DEFAULT_GIF_DURATION_MS, Animation, FrameCache
+from frame_clock import FrameClock
+from library import BackgroundLibrary
+from variants import VariantStore, closest_library
 
 logger = logging.getLogger("blinky.led")
 
-SKIP = Path(f'{Constants.work_dir}/config_files/skip')
 
 PROGRAMS_DIR = Path(__file__).parent / 'programs'
 
@@ -43,6 +52,15 @@ def _discover_programs() -> list[str]:
     return programs
 
 
+def _is_background_path(path: str) -> bool:
+    return "backgrounds" in path
+
+
+def _skip_requested() -> bool:
+    """Consume a skip sent over the control socket."""
+    return notify.consume('skip')
+
+
 class PixelBuffer:
     """Captures set_xy calls from a program render() then flushes to the real display.
 
@@ -54,9 +72,7 @@ class PixelBuffer:
         self._display = display
         self._width = width
         self._height = height
-        self._buf: list[list[tuple[float, float, float]]] = [
-            [(0.0, 0.0, 0.0)] * width for _ in range(height)
-        ]
+        self._buf = np.zeros((height, width, 3), dtype=np.float32)
 
     # Proxy Display interface so programs can call these normally
     def set_brightness(self) -> None:
@@ -67,20 +83,17 @@ class PixelBuffer:
 
     def set_xy(self, x: int, y: int, color: tuple) -> None:
         if 0 <= x < self._width and 0 <= y < self._height:
-            self._buf[y][x] = color
+            self._buf[y, x] = color[:3]
 
-    def flush(self, text=None) -> None:
+    def set_frame(self, frame: np.ndarray) -> None:
+        self._buf[:] = frame
+
+    def flush(self, text_mask: np.ndarray | None = None) -> None:
         """Push the buffered frame to the real display, applying text overlay if needed."""
-        for y in range(self._height):
-            for x in range(self._width):
-                pixel = self._buf[y][x]
-                if text:
-                    pixel = tuple(ch * 0.15 for ch in pixel)
-                self._display.set_xy(x, y, pixel)
-        if text:
-            for coord in text:
-                if coord[0] < self._width:
-                    self._display.set_xy(coord[0], coord[1], (255, 255, 255))
+        frame = np.clip(self._buf, 0, 255).astype(np.uint8)
+        if text_mask is not None:
+            frame = overlay.composite(frame, text_mask, Options.text_dim, Options.text_color)
+        self._display.set_frame(frame)
         if self._display.is_running():
             self._display.show()
 
@@ -88,14 +101,27 @@ class PixelBuffer:
 class GifPlayer:
     """Plays GIF files and background images on a Display.
 
-    Encapsulates per-play state (text overlay generator, ad timer) so that
+    Encapsulates per-play state (text scroller, ad timer) so that
     text scrolls smoothly across GIF transitions without leaking globals.
     """
 
-    def __init__(self, display: Display, display_resolution: tuple[int, int]) -> None:
+    def __init__(
+        self,
+        display: Display,
+        display_resolution: tuple[int, int],
+        variants: VariantStore | None = None,
+    ) -> None:
         self._display = display
         self._resolution = display_resolution
-        self._text_gen: Iterator | None = None
+        self._variants = variants
+        self._scroller: overlay.TextScroller | None = None
+        self._playing: str | None = None
+        self._user_content = False  # a queued GIF, which mood and program switches do not cut short
+        self._program_turn = 0  # programs started so far, to continue the cycle after a skip
+        self._clock = FrameClock(policy=Options.frame_policy)
+        self._cache = FrameCache(Constants.frame_cache_bytes)
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self._prefetched: dict[str, Future[Animation]] = {}
         self._scheduler = BackgroundScheduler()
         self._scheduler.add_job(
             self._enqueue_ad,
@@ -104,12 +130,22 @@ class GifPlayer:
             id='ad',
         )
         self._scheduler.start()
+        # Load the font and rasterize the recurring ad off the render thread
+        self._prefetcher.submit(txt_q.rasterize, self._ad_text())
+
+    @staticmethod
+    def _ad_text() -> str:
+        return f'Write me at t.me/{Constants.ad_link}'
 
     def _enqueue_ad(self) -> None:
-        txt_q.put(f'Write me at t.me/{Constants.ad_link}')
+        try:
+            txt_q.put(self._ad_text(), sender='ad')
+        except QueueFull:
+            logger.info('Text queue is full, skipping the ad')
 
     def stop(self) -> None:
         self._scheduler.shutdown(wait=False)
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
 
     # ------------------------------------------------------------------
     # Public API
@@ -117,10 +153,30 @@ class GifPlayer:
 
     def play(self, filepath: str) -> None:
         self._filepath = filepath
-        self._draw_gif(filepath)
+        self._playing = filepath
+        self._user_content = not _is_background_path(filepath)
+        try:
+            self._draw_gif(filepath)
+        finally:
+            self._playing = None
+
+    def status(self) -> dict:
+        """What is on the wall, for the control socket."""
+        playing = self._playing
+        return {'playing': playing, 'user_content': playing is not None and self._user_content}
+
+    def prefetch(self, filepath: str) -> None:
+        """Start loading filepath on a worker thread so that a later play() of it starts instantly."""
+        if filepath in self._prefetched:
+            # Already loading, e.g. the same background picked twice in a row
+            return
+        # Keep the one about to play plus the new one; anything older was superseded
+        while len(self._prefetched) >= 2:
+            self._prefetched.pop(next(iter(self._prefetched))).cancel()
+        self._prefetched[filepath] = self._prefetcher.submit(self._load, filepath)
 
     def play_programmatic(self, pill: threading.Event) -> None:
-        """Run programmatic programs until aborted (skip, pill, or gif queued)."""
+        """Run programmatic programs until aborted (skip, pill, gif queued, or mode or program changed)."""
         programs = _discover_programs()
         if not programs:
             logger.warning('No programs found in %s', PROGRAMS_DIR)
@@ -129,153 +185,170 @@ class GifPlayer:
 
         selected = Options.program
         program_list = [f'programs.{selected}'] if selected and f'programs.{selected}' in programs else programs
+        # Pick up the cycle where the last call left it
+        start = self._program_turn % len(program_list)
+        program_list = program_list[start:] + program_list[:start]
 
         width, height = self._resolution
         for program_name in program_list:
             if pill.is_set():
                 break
+            self._program_turn += 1
             # Reload so state resets each time
             if program_name in sys.modules:
                 importlib.reload(sys.modules[program_name])
             module = importlib.import_module(program_name)
             fps = getattr(module, 'get_fps', lambda: 30)()
-            frame_delay = 1.0 / fps
+            clock = FrameClock(fps, policy=Options.frame_policy)
             frame_num = 0
             logger.info('Programmatic: playing %s at %d fps', program_name, fps)
+            self._playing = program_name
+            self._user_content = False
 
+            aborted = False
             while self._display.is_running() and not pill.is_set():
-                if SKIP.exists():
-                    os.remove(SKIP)
-                    break
-                if q.has_items():
+                # A skip follows every mood and program switch: hand back to the run loop,
+                # which starts the next program or leaves programmatic mode
+                if (_skip_requested() or q.has_items()
+                        or (Options.playlistmode, Options.program) != ('programmatic', selected)):
+                    aborted = True
                     break
                 self._display.set_brightness()
                 buf = PixelBuffer(self._display, width, height)
                 module.render(buf, width, height, frame_num)
                 txt = self._get_text()
                 buf.flush(txt)
-                time.sleep(frame_delay)
+                clock.wait()
                 frame_num += 1
+            logger.info('Programmatic: %s ran at %.1f fps', program_name, clock.achieved_fps)
+            if aborted:
+                break
+        self._playing = None
 
     # ------------------------------------------------------------------
     # Frame rendering
     # ------------------------------------------------------------------
 
-    def _draw_frame(self, frame: Image.Image) -> None:
-        rgb_frame = frame.convert('RGB')
-        txt = self._get_text()
-        for y in range(self._resolution[1]):
-            for x in range(self._resolution[0]):
-                pixel = cast(tuple[int, int, int], rgb_frame.getpixel((x, y)))
-                if not txt:
-                    self._display.set_xy(x, y, pixel)
-                else:
-                    new_rgb = tuple(ch * 0.15 for ch in pixel)
-                    self._display.set_xy(x, y, new_rgb)
-        if txt:
-            self._write_text(txt)
+    def _draw_frame(self, frame: np.ndarray, duration: int) -> None:
+        text_mask = self._get_text()
+        if text_mask is not None:
+            frame = overlay.composite(frame, text_mask, Options.text_dim, Options.text_color)
+        self._display.set_frame(frame)
         if self._display.is_running():
             self._display.show()
         else:
             logger.warning("display.show() called but display not running")
-        if 'duration' in frame.info:
-            if isinstance(frame.info['duration'], int):
-                if frame.info['duration'] > 100:
-                    time.sleep((frame.info['duration'] - 100) / 1000)
-
-    def _write_text(self, text) -> None:
-        if not text:
-            return
-        for coord in text:
-            if coord[0] < self._resolution[0]:
-                self._display.set_xy(coord[0], coord[1], (255, 255, 255))
+        self._clock.wait(duration / 1000)
 
     # ------------------------------------------------------------------
     # Text overlay state machine
     # ------------------------------------------------------------------
 
-    def _get_text(self):
-        if not self._text_gen and txt_q.has_items():
-            text = txt_q.pop()
-            self._text_gen = self._text_generator(text, self._resolution)
-            return next(self._text_gen, None)
-        elif self._text_gen is not None:
-            text = next(self._text_gen, None)
-            if text:
-                return text
-            self._text_gen = None
-        return None
-
-    def _text_generator(
-        self,
-        text: list[list[int]],
-        screen_resolution: tuple[int, int],
-    ) -> Generator:
-        """Shifts text dots one x-column per text_speed frames until all are off screen."""
-        frame_counter = 0
-        for dot in range(len(text)):
-            text[dot][0] += screen_resolution[0]
-        while text:
-            frame_counter += 1
-            if frame_counter % Options.text_speed != 0:
-                yield text
-            else:
-                remove = []
-                for dot in range(len(text)):
-                    if text[dot][0] == 0:
-                        remove.append(text[dot])
-                    else:
-                        text[dot][0] -= 1
-                text = [x for x in text if x not in remove]
-                yield text
+    def _get_text(self) -> np.ndarray | None:
+        """Mask of the text to overlay on this frame, None when no text is scrolling."""
+        if self._scroller is None and txt_q.has_items():
+            bitmap = txt_q.pop()
+            if bitmap is not None:
+                self._scroller = overlay.TextScroller(bitmap, self._resolution)
+        if self._scroller is None:
+            return None
+        mask = self._scroller.step(Options.scroll_speed)
+        if mask is None:
+            self._scroller = None
+        return mask
 
     # ------------------------------------------------------------------
     # GIF lifecycle helpers
     # ------------------------------------------------------------------
 
     def _is_background(self) -> bool:
-        return "backgrounds" in self._filepath
+        return _is_background_path(self._filepath)
 
     def _should_abort(self) -> bool:
-        if SKIP.exists():
-            os.remove(SKIP)
+        if _skip_requested():
             return True
         return self._is_background() and q.has_items()
 
-    def _show_photo(self, image: Image.Image) -> None:
+    def _show_photo(self, image: np.ndarray) -> None:
         for _ in range(50):
-            self._draw_frame(image)
+            self._draw_frame(image, DEFAULT_GIF_DURATION_MS)
 
-    def _loop_gif(self, image: Image.Image, duration: int) -> None:
+    def _loop_gif(self, animation: Animation, duration: int) -> None:
         runtime = 0
         while runtime <= duration and not self._should_abort() and self._display.is_running():
-            for frame in ImageSequence.Iterator(image):
+            for frame, frame_duration in zip(animation.frames, animation.durations.tolist()):
                 self._display.set_brightness()
                 if not self._display.is_running():
                     break
-                runtime += frame.info['duration']
-                self._draw_frame(frame)
+                runtime += frame_duration
+                self._draw_frame(frame, frame_duration)
                 if self._should_abort():
                     break
 
+    def _stream_video(self, path: str) -> None:
+        """Play a video once while FFmpeg decodes it."""
+        try:
+            stream = video.VideoStream(path, self._resolution)
+        except OSError:
+            logger.exception('Could not start decoding %s', path)
+            return
+        with stream:
+            for frame in stream:
+                self._display.set_brightness()
+                if not self._display.is_running() or self._should_abort():
+                    break
+                self._draw_frame(frame, stream.frame_ms)
+
+    def _load(self, path: str) -> Animation:
+        """Map a compiled playback file when there is one, decode the GIF otherwise."""
+        compiled = path if path.endswith(playback.SUFFIX) else playback.find_compiled(path, Options.resize_mode)
+        if compiled:
+            animation = playback.load(compiled)
+            if animation.frames.shape[1:3] == (self._resolution[1], self._resolution[0]):
+                return animation
+            logger.warning('%s does not match the display resolution, decoding %s', compiled, path)
+        if _is_background_path(path):
+            if self._variants is not None and (variant := self._variants.lookup(path)):
+                return playback.load(variant)
+            # Adapt in process until the variant is built, so playback never waits on it
+            return self._cache.get(path, self._resolution, Options.resize_mode)
+        # Queued files are played once and buried, caching them would only evict backgrounds
+        return frame_cache.decode(path, self._resolution, Options.resize_mode)
+
+    def _take_prefetched(self, path: str) -> Animation | None:
+        future = self._prefetched.pop(path, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            logger.exception('Prefetching %s failed', path)
+            return None
+
     def _bury_in_graveyard(self) -> None:
-        os.rename(self._filepath, f'{Constants.work_dir}/graveyard/{time.time()}.gif')
+        suffix = os.path.splitext(self._filepath)[1]
+        os.rename(self._filepath, f'{Constants.work_dir}/graveyard/{time.time()}{suffix}')
 
     def _draw_gif(self, gif_path: str) -> None:
         total_loop_duration = 500
         logger.info('Playing: %s', gif_path)
-        img = Image.open(gif_path)
-        if 'duration' in img.info:
-            self._loop_gif(img, total_loop_duration)
+        self._clock.reset()
+        self._clock.policy = Options.frame_policy
+        if video.is_video(gif_path):
+            self._stream_video(gif_path)
         else:
-            self._show_photo(img)
+            animation = self._take_prefetched(gif_path) or self._load(gif_path)
+            if animation.still:
+                self._show_photo(animation.frames[0])
+            else:
+                self._loop_gif(animation, total_loop_duration)
 
         if not self._is_background():
             logger.info("Moving to graveyard: %s", gif_path)
             self._bury_in_graveyard()
 
 
-def init(x_boxes: int, y_boxes: int, rotate_90: bool) -> tuple[tuple[int, int], Display]:
+def init(x_boxes: int, y_boxes: int, rotate_90: bool, threaded: bool = True) -> tuple[tuple[int, int], Display]:
     led_count = x_boxes * y_boxes * 20
     x_res, y_res = (x_boxes * 5, y_boxes * 4) if not rotate_90 else (x_boxes * 4, y_boxes * 5)
     display_resolution = (x_res, y_res)
@@ -284,6 +357,11 @@ def init(x_boxes: int, y_boxes: int, rotate_90: bool) -> tuple[tuple[int, int],
     if Constants.use_neopixel:
         logger.info("Setting up NeoPixel display")
         display = d.NeoPixelDisplay(led_count, x_boxes, y_boxes, rotate_90)
+        if threaded:
+            display = d.ThreadedDisplay(display, display_resolution)
+    elif Constants.headless:
+        logger.info("Setting up headless display")
+        display = d.NullDisplay(x_res, y_res)
     else:
         logger.info("Setting up PyGame Debug display")
         display = d.PyGameDisplay(x_res, y_res, 50)
@@ -291,30 +369,60 @@ def init(x_boxes: int, y_boxes: int, rotate_90: bool) -> tuple[tuple[int, int],
     return display_resolution, display
 
 
-def matches_pattern(filepath: str, pattern: str) -> bool:
-    filepath = filepath.lower()
-    tokens = pattern.lower().split(" ")
-    matches = True
-    for token in tokens:
-        if token not in filepath:
-            matches = False
-    return matches
+def _pick_background(library: BackgroundLibrary, variants: VariantStore | None = None) -> str:
+    library.refresh()
+    if Options.playlistmode == "mood":
+        backgrounds = library.by_mood(Options.mood)
+        if not backgrounds:
+            logger.warning("No mood %s in %s", Options.mood, library.root)
+            backgrounds = library.by_mood('default')
+    else:
+        backgrounds = library.search(Options.pattern)
+        if not backgrounds:
+            logger.warning("No gif matching %s in %s", Options.pattern, library.root)
+            backgrounds = library.by_mood('default')
+    if variants is not None:
+        # Prefer backgrounds whose panel variant is built; the rest are being built meanwhile
+        backgrounds = [path for path in backgrounds if variants.is_ready(path)] or backgrounds
+    return random.choice(backgrounds)
 
 
 def main(pill: threading.Event = threading.Event(), x_boxes: int = 5, y_boxes: int = 3, rotate_90: bool = False) -> None:
     display_resolution, display = init(x_boxes, y_boxes, rotate_90)
     res_str = f'{display_resolution[0]}_{display_resolution[1]}'
-    if not os.path.isdir(f"{Constants.work_dir}/data/backgrounds/{res_str}/"):
-        raise FileNotFoundError(f'No background with fitting resolution available at {Constants.work_dir}/data/backgrounds/{res_str}/')
+    backgrounds_root = f"{Constants.work_dir}/data/backgrounds"
+    library_root = f"{backgrounds_root}/{res_str}"
+    variants = None
+    if not os.path.isdir(library_root):
+        # No hand made copy for this layout: adapt the closest library on first use
+        library_root = str(closest_library(backgrounds_root, display_resolution))
+        logger.warning('No backgrounds for %s, adapting %s', res_str, library_root)
+        variants = VariantStore(Constants.variant_cache, display_resolution, Options.resize_mode)
 
     os.makedirs(f"{Constants.work_dir}/graveyard", exist_ok=True)
     os.makedirs(f"{Constants.work_dir}/gifs", exist_ok=True)
 
-    player = GifPlayer(display, display_resolution)
+    notify.listen()
+    player = GifPlayer(display, display_resolution, variants)
+    library = BackgroundLibrary(library_root)
+
+    def moods() -> list[str]:
+        library.refresh()
+        return library.moods()
+
+    server = control.ControlServer(player.status, lambda: [p.split('.')[-1] for p in _discover_programs()], moods)
+    server.start()
+    if variants is not None:
+        variants.warm(path for mood in library.moods() for path in library.by_mood(mood))
     try:
-        _run_loop(player, display, display_resolution, pill, res_str)
+        _run_loop(player, display, display_resolution, pill, library, variants)
     finally:
+        server.close()
+        Options.flush()
         player.stop()
+        display.close()
+        if variants is not None:
+            variants.close()
 
 
 def _run_loop(
@@ -322,10 +430,12 @@ def _run_loop(
     display: Display,
     display_resolution: tuple[int, int],
     pill: threading.Event,
-    res_str: str,
+    library: BackgroundLibrary,
+    variants: VariantStore | None = None,
 ) -> None:
+    upcoming: tuple[tuple[str, str, str], str] | None = None
     while display.is_running() and not pill.is_set():
-        if next_gif := q.take():
+        if q.has_items() and (next_gif := q.take()):
             try:
                 player.play(next_gif)
             except KeyboardInterrupt:
@@ -341,18 +451,17 @@ def _run_loop(
                 logger.exception('Programmatic player error')
                 time.sleep(2)
         else:
-            mood = Options.mood
-            pattern = Options.pattern
-            if Options.playlistmode == "mood":
-                backgrounds = glob.glob(f"{Constants.work_dir}/data/backgrounds/{res_str}/{mood}/*.gif")
+            # Pick the following background now and decode it while this one plays.
+            # Queued GIFs are taken first above, the prefetched background just waits.
+            selection = (Options.playlistmode, Options.mood, Options.pattern)
+            if upcoming is not None and upcoming[0] == selection:
+                background = upcoming[1]
             else:
-                backgrounds = glob.glob(f"{Constants.work_dir}/data/backgrounds/{res_str}/*/*.gif")
-                backgrounds = list(filter(lambda f: matches_pattern(f, pattern), backgrounds))
-                if not backgrounds:
-                    logger.warning("No gif in %s/data/%s/backgrounds/%s or %s/gifs", Constants.work_dir, res_str, mood, Constants.work_dir)
-                    backgrounds = glob.glob(f"{Constants.work_dir}/data/backgrounds/{res_str}/default/*.gif")
+                background = _pick_background(library, variants)
+            upcoming = (selection, _pick_background(library, variants))
+            player.prefetch(upcoming[1])
             try:
-                player.play(random.choice(backgrounds))
+                player.play(background)
             except KeyboardInterrupt:
                 logger.info("Interrupted, exit, over and out")
                 sys.exit()
@@ -362,7 +471,7 @@ def _run_loop(
 
 
 def debug(x_boxes: int = 5, y_boxes: int = 3, rotate_90: bool = False) -> None:
-    _resolution, display = init(x_boxes, y_boxes, rotate_90)
+    _resolution, display = init(x_boxes, y_boxes, rotate_90, threaded=False)
     cast(d.NeoPixelDisplay, display).run_debug()
 
 
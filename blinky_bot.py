@@ -5,24 +5,38 @@ import os
 import sys
 import threading
 import traceback
-from pathlib import Path
+from concurrent.futures import Future
 from signal import SIGINT, signal
 
-from ffmpy import FFmpeg
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 
+import control
 import text_queue as txt
 import thequeue as q
-from config import Constants, Main_Options as Options
+from config import Constants, Main_Options as Options, settings
+from durable_queue import QueueFull
+from ingest import Ingestor, MediaCache
+from library import BackgroundLibrary
 
-GIF_COUNTER = 0
+_LIBRARY: BackgroundLibrary | None = None
+_INGESTOR: Ingestor | None = None
 
 # Enable logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger("blinky.bot")
 
 
+def _library() -> BackgroundLibrary:
+    """Background index shared by the handlers, built on first use and refreshed on every call."""
+    global _LIBRARY
+    if _LIBRARY is None:
+        _LIBRARY = BackgroundLibrary(os.path.join(Constants.work_dir, 'data', 'backgrounds', '25_12'))
+    else:
+        _LIBRARY.refresh()
+    return _LIBRARY
+
+
 async def start(update, context):
     logger.info("Handler: /start from chat_id=%s", update.effective_chat.id)
     await update.effective_chat.send_message('Hi! Type /help to see what I can do.')
@@ -50,14 +64,8 @@ async def help(update, context):
         return
 
     from blinky import _discover_programs
-    import os
 
-    res_str = '25_12'
-    backgrounds_root = os.path.join(Constants.work_dir, 'data', 'backgrounds', res_str)
-    moods = sorted(
-        d for d in os.listdir(backgrounds_root)
-        if os.path.isdir(os.path.join(backgrounds_root, d))
-    )
+    moods = _library().moods()
     programs = [p.split('.')[-1] for p in _discover_programs()]
 
     control_section = (
@@ -70,7 +78,7 @@ async def help(update, context):
         f"  /programs — list programs\n"
         f"  /skip — skip current GIF or program\n"
         f"  /brightness <0–100> — set brightness (e.g. /brightness 40)\n"
-        f"  /text\\_speed <number> — scroll speed, default 70 (higher = slower)\n"
+        f"  /text\\_speed <number> — scroll speed in pixels per second, default 8\n"
     )
 
     message = public_section + "\n" + control_section
@@ -88,14 +96,29 @@ async def help(update, context):
     await update.effective_chat.send_message(message, parse_mode='Markdown')
 
 
+async def _control(cmd: str, value=None, programs: list[str] | None = None, moods: list[str] | None = None) -> dict:
+    """Send a command to the player, or change the setting directly when the player is not running."""
+    try:
+        return await control.request_async(cmd, value)
+    except OSError as e:
+        logger.warning("Player not reachable (%s), applying %s directly", e, cmd)
+        if cmd == 'skip':
+            return {'ok': False, 'error': "The wall is not playing anything right now"}
+        return control.apply(cmd, value, programs, moods)
+
+
 async def text_speed(update, context):
     if not await check_access(update):
         return
-    if context.args and isinstance(int(context.args[0]), int):
-        Options.text_speed = int(context.args[0])
-        await update.effective_chat.send_message(f"Text speed set to {context.args[0]}")
+    try:
+        speed = float(context.args[0])
+    except (IndexError, ValueError):
+        speed = 0
+    if speed > 0:
+        Options.scroll_speed = speed
+        await update.effective_chat.send_message(f"Text speed set to {context.args[0]} pixels per second")
     else:
-        await update.effective_chat.send_message(f"Text speed can only be a round number. Default is 70 e.g. /text_speed 70")
+        await update.effective_chat.send_message("Text speed is in pixels per second. Default is 8 e.g. /text_speed 8")
 
 
 async def brightness(update, context):
@@ -103,8 +126,11 @@ async def brightness(update, context):
         return
     if context.args:
         b = float(context.args[0]) / 100
-        Options.brightness = b
-        await update.effective_chat.send_message(f"Brightness set to {context.args[0]} : {b}")
+        reply = await _control('brightness', b)
+        if reply['ok']:
+            await update.effective_chat.send_message(f"Brightness set to {context.args[0]} : {b}")
+        else:
+            await update.effective_chat.send_message(reply['error'])
     else:
         await update.effective_chat.send_message(f"What percent of brightness do you want dear? E.g. /brightness 40")
 
@@ -112,18 +138,27 @@ async def brightness(update, context):
 async def mood(update, context):
     if not await check_access(update):
         return
-    Options.mood = context.args[0]
-    Options.playlistmode = "mood"
-    await update.effective_chat.send_message(f"Mood set {context.args[0]}")
+    if not context.args:
+        await update.effective_chat.send_message(f"Which mood? E.g. /mood {', '.join(_library().moods())}")
+        return
+    reply = await _control('mood', context.args[0], moods=_library().moods())
+    if reply['ok']:
+        await update.effective_chat.send_message(f"Mood set {context.args[0]}")
+    else:
+        await update.effective_chat.send_message(reply['error'])
 
 
 async def play(update, context):
     if not await check_access(update):
         return
     if context.args:
+        matches = len(_library().search(context.args[0]))
         Options.pattern = context.args[0]
         Options.playlistmode = "pattern"
-        await update.effective_chat.send_message(f"Playing anything matching {context.args[0]} — note that it may not match anything")
+        if matches:
+            await update.effective_chat.send_message(f"Playing {matches} GIFs matching {context.args[0]}")
+        else:
+            await update.effective_chat.send_message(f"Nothing matches {context.args[0]}, playing the default mood")
     else:
         await update.effective_chat.send_message("You need to provide something to select GIFs from our catalogue")
 
@@ -140,12 +175,10 @@ async def program(update, context):
                 f"Unknown program '{name}'. Available: {', '.join(available)}"
             )
             return
-        Options.program = name
-        Options.playlistmode = 'programmatic'
+        await _control('program', name, available)
         await update.effective_chat.send_message(f"Switched to programmatic mode: {name}")
     else:
-        Options.program = ''
-        Options.playlistmode = 'programmatic'
+        await _control('program', '', available)
         await update.effective_chat.send_message(
             f"Switched to programmatic mode (cycling all):\n{', '.join(available)}"
         )
@@ -166,13 +199,20 @@ async def text(update, context):
     if len(update.effective_message.text) > 120:
         await update.effective_chat.send_message("Sorry that's quite the text and I'm a little lazy. Can you make it shorter?")
     else:
-        txt.put(update.effective_message.text)
+        try:
+            eta = txt.put(update.effective_message.text, str(update.effective_chat.id))
+        except QueueFull:
+            await update.effective_chat.send_message("You have a few texts waiting already, let them scroll by first.")
+            return
+        await update.effective_chat.send_message(_wait_message(eta))
 
 
 async def skip(update, context):
     if not await check_access(update):
         return
-    Path(f'{Constants.work_dir}/config_files/skip').touch()
+    reply = await _control('skip')
+    if not reply['ok']:
+        await update.effective_chat.send_message(reply['error'])
 
 
 async def voice_handler(update, context):
@@ -195,9 +235,9 @@ async def gif_handler(update, context):
     logger.info(f'Starting Gif Handler')
     if update.effective_message.document.file_size < 20000000:
         mp4 = await context.bot.get_file(update.effective_message.document.file_id)
-        await mp4.download_to_drive(f'{Constants.work_dir}/media.mp4')
-        logger.info(os.path.getsize(f'{Constants.work_dir}/media.mp4'))
-        put_gifs(f'{Constants.work_dir}/media.mp4')
+        data = await mp4.download_as_bytearray()
+        logger.info(len(data))
+        await _ingest(update, context, bytes(data))
     else:
         await update.effective_chat.send_message("""Wow! Sry that's way to big!
                 I'm just a little pi and I can't handle that much traffic.
@@ -207,30 +247,59 @@ async def gif_handler(update, context):
 async def image_handler(update, context):
     logger.info(f'Starting Image Handler')
     pic = await context.bot.get_file(update.effective_message.photo[-1].file_id)
-    await pic.download_to_drive(f'{Constants.work_dir}/photo.gif')
-    put_gifs(f'{Constants.work_dir}/photo.gif')
+    await _ingest(update, context, bytes(await pic.download_as_bytearray()))
 
 
-def put_gifs(telegram_file):
-    global GIF_COUNTER
-    out = f'{Constants.work_dir}/gifs/{GIF_COUNTER:06d}.gif'
+def _ingestor() -> Ingestor:
+    global _INGESTOR
+    if _INGESTOR is None:
+        _INGESTOR = Ingestor(f'{Constants.work_dir}/gifs', settings.display_resolution,
+                             MediaCache(Constants.media_cache, Constants.media_cache_bytes), Constants.ingest_workers)
+    return _INGESTOR
+
+
+def _wait_message(eta: float) -> str:
+    if eta < 5:
+        return "Coming up on the wall right now!"
+    if eta < 90:
+        return f"On the wall in about {round(eta)} seconds."
+    return f"On the wall in about {round(eta / 60)} minutes."
+
+
+async def _ingest(update, context, data: bytes) -> None:
+    """Hand an upload to the conversion workers and answer right away; the result is reported later."""
+    ingestor = _ingestor()
+    ahead = ingestor.jobs
     try:
-        ff = FFmpeg(
-            inputs={telegram_file: '-y -hide_banner -loglevel error'},
-            outputs={out: '-s 25x12'})
-        ff.run()
-        try:
-            with open(out) as f:
-                logger.info(f'Gif creation successful: {out}')
-        except IOError:
-            logger.exception(f'Gif creation failed: {out}')
-    except Exception as e:
-        logger.exception('FFmpeg Error!')
+        # Hashing a 20 MB upload for the cache lookup takes a while on a Pi
+        future = await asyncio.to_thread(ingestor.submit, data, Options.video_mode == 'stream')
+    except QueueFull:
+        await update.effective_chat.send_message("I'm still busy converting other stuff, send it again in a bit.")
+        return
+    # Done already when converted before; then the wait is all there is to report
+    if not future.done():
+        if ahead:
+            await update.effective_chat.send_message(f"Got it! {ahead} ahead of yours, converting soon.")
+        else:
+            await update.effective_chat.send_message("Got it! Converting…")
+    context.application.create_task(_queue_converted(update, future), update=update)
+
+
+async def _queue_converted(update, future: Future) -> None:
+    try:
+        out = await asyncio.wrap_future(future)
+    except Exception:
+        logger.exception('Converting failed')
+        await update.effective_chat.send_message("Sorry, I couldn't convert that one.")
+        return
     try:
-        q.mark_ready(out)
-        GIF_COUNTER += 1
-    except Exception as e:
-        logger.exception('Failure adding gif to queue')
+        # Off the event loop: a streamed video is measured by ffprobe, which can take seconds
+        eta = await asyncio.to_thread(q.mark_ready, out, str(update.effective_chat.id))
+    except QueueFull:
+        os.remove(out)
+        await update.effective_chat.send_message("You have a few GIFs waiting already, let them play first.")
+        return
+    await update.effective_chat.send_message(_wait_message(eta))
 
 
 async def access_handler(update, context):
@@ -463,6 +532,9 @@ class System:
         await self.app.updater.stop()
         await self.app.stop()
         await self.app.shutdown()
+        if _INGESTOR is not None:
+            _INGESTOR.close()
+        Options.flush()
 
     def start(self, pill: threading.Event = threading.Event()) -> None:
         import asyncio as _asyncio
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, request
 
 import text_queue as txt
+from durable_queue import QueueFull
 
 app = Flask(__name__)
 
@@ -8,9 +9,14 @@ app = Flask(__name__)
 @app.route('/', methods=['POST', 'GET'])
 def home():
     if request.method == 'POST':
-        print(request.form['text'])
-        txt.put(request.form['text'])
-        return render_template('wait.html', text=request.form['text'], length=5 + len(request.form['text']))
+        text = request.form['text']
+        print(text)
+        try:
+            eta = txt.put(text, request.remote_addr or '')
+        except QueueFull:
+            return render_template('wait.html', text=text, eta=None, length=5)
+        # Come back to the form once the text has scrolled by
+        return render_template('wait.html', text=text, eta=round(eta), length=eta + txt.scroll_seconds(text))
     return render_template('landing.html')
 
 
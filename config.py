@@ -1,7 +1,9 @@
+import atexit
 import dataclasses
 import json
 import logging
 import os
+import threading
 from pathlib import Path
 from typing import Literal
 
@@ -12,6 +14,7 @@ logger = logging.getLogger('blinky.config')
 class Settings:
     """Lightweight settings for the programmatic player (no env var deps)."""
     use_neopixel: bool = dataclasses.field(default_factory=lambda: 'NEOPIXEL' in os.environ)
+    headless: bool = dataclasses.field(default_factory=lambda: 'HEADLESS' in os.environ)
     display_resolution: tuple = (25, 12)
 
 
@@ -22,23 +25,43 @@ settings = Settings()
 class Constants:
     work_dir: str = os.environ.get('WORK_DIR', '')
     use_neopixel: bool = 'NEOPIXEL' in os.environ
+    headless: bool = 'HEADLESS' in os.environ
     waiting_line: Path = Path(work_dir + "/config_files/waiting_line")
     waiting_line_lock: Path = Path(work_dir + "/config_files/waiting_line.lock")
     ad_link: str = os.environ.get('AD_LINK', '')
     root: int = int(os.environ.get('ROOT', '0'))
     saved_config: Path = Path(work_dir + '/config_files/dumped_config')
+    notify_socket: Path = Path(work_dir + '/config_files/notify.sock')
+    control_socket: Path = Path(work_dir + '/config_files/control.sock')
+    variant_cache: Path = Path(work_dir + '/cache/variants')
+    frame_cache_bytes: int = int(os.environ.get('FRAME_CACHE_MB', '32')) * 1024 * 1024
+    ingest_workers: int = int(os.environ.get('INGEST_WORKERS', '1'))
+    media_cache: Path = Path(work_dir + '/cache/media')
+    media_cache_bytes: int = int(float(os.environ.get('MEDIA_CACHE_MB', '64')) * 1024 * 1024)
+
+
+# Seconds a change to Options waits for further changes before all are written
+SAVE_DELAY = 2.0
 
 
 @dataclasses.dataclass(kw_only=True)
 class Options:
     brightness: float = 1
-    text_speed: int = 70
+    gamma: float = 1.0  # 1.0 = linear output, ~2.2 for perceptually even fades
+    scroll_speed: float = 8  # text scroll speed in pixels per second
+    text_dim: float = 0.15  # background brightness factor while text scrolls
+    text_color: list[int] = dataclasses.field(default_factory=lambda: [255, 255, 255])
+    frame_policy: Literal['drop', 'catch_up'] = 'drop'  # what the frame clock does after a late frame
     playlistmode: str = 'mood'
     mood: str = 'default'
     pattern: str = 'default'
     program: str = ''  # '' = cycle all programs, 'plasma' = specific program
     led_type: Literal['rgb', 'grb'] = 'grb'
+    resize_mode: Literal['fit', 'cut', 'scale'] = 'scale'  # how off-size animations are adapted to the panel
+    video_mode: Literal['convert', 'stream'] = 'convert'  # convert uploaded videos up front or decode while playing
     adtime: int = 1200
+    queue_per_sender: int = 5  # GIFs or texts one sender may have waiting
+    queue_total: int = 50  # GIFs or texts waiting in all
     allowed_ids: list[int] = dataclasses.field(default_factory=lambda: [int(os.environ.get('ROOT', '0'))])
     user_names: dict = dataclasses.field(default_factory=dict)  # str(id) -> display name
 
@@ -46,8 +69,17 @@ class Options:
         if os.path.exists(Constants.saved_config):
             with open(Constants.saved_config, 'r') as save_file:
                 old_config = json.load(fp=save_file)
+            fields = {field.name for field in dataclasses.fields(self)}
             for key, value in old_config.items():
+                # Settings removed since the file was written, such as text_speed, are dropped
+                if key not in fields:
+                    logger.info('Dropping unknown setting %r from %s', key, Constants.saved_config)
+                    continue
                 object.__setattr__(self, key, value)
+        object.__setattr__(self, '_save_lock', threading.Lock())
+        object.__setattr__(self, '_write_lock', threading.Lock())
+        object.__setattr__(self, '_save_timer', None)
+        object.__setattr__(self, '_save_path', Constants.saved_config)
         # Mark initialisation complete; __setattr__ guards on this flag.
         # Use object.__setattr__ so the flag itself doesn't trigger a save.
         object.__setattr__(self, '_initialized', True)
@@ -69,9 +101,38 @@ class Options:
         self.__save_config()
 
     def __save_config(self):
-        data = {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
-        with open(Constants.saved_config, 'w+') as save_file:
-            json.dump(data, fp=save_file, sort_keys=True, indent=4)
+        """Write the change SAVE_DELAY seconds from now, together with any made meanwhile."""
+        with self._save_lock:
+            object.__setattr__(self, '_save_path', Constants.saved_config)
+            if self._save_timer is None:
+                timer = threading.Timer(SAVE_DELAY, self.flush)
+                timer.daemon = True
+                object.__setattr__(self, '_save_timer', timer)
+                timer.start()
+
+    def flush(self):
+        """Write pending changes now. Runs after SAVE_DELAY, on shutdown and at exit."""
+        with self._write_lock:
+            with self._save_lock:
+                timer = self._save_timer
+                if timer is None:
+                    return
+                timer.cancel()
+                object.__setattr__(self, '_save_timer', None)
+                data = json.dumps({k: v for k, v in self.__dict__.items() if not k.startswith('_')},
+                                  sort_keys=True, indent=4)
+                path = self._save_path
+            # Replaced in one step, so a power cut leaves the old file or the new one
+            tmp = f'{path}.{os.getpid()}.tmp'
+            try:
+                with open(tmp, 'w') as save_file:
+                    save_file.write(data)
+                    save_file.flush()
+                    os.fsync(save_file.fileno())
+                os.replace(tmp, path)
+            except OSError:
+                logger.exception('Could not save the config to %s', path)
 
 
 Main_Options = Options()
+atexit.register(Main_Options.flush)
@@ -0,0 +1,205 @@
+"""Control API of the player: one JSON object per line over a Unix socket.
+
+Requests and replies:
+
+    {"cmd": "skip"}                           {"ok": true}
+    {"cmd": "brightness", "value": 0.4}       {"ok": true}
+    {"cmd": "program", "value": "plasma"}     {"ok": true}, "" cycles all programs
+    {"cmd": "mood", "value": "chill"}         {"ok": true}
+    {"cmd": "status"}                         {"ok": true, "playing": ..., "queued_gifs": 2, ...}
+
+Failures reply {"ok": false, "error": "..."}. A mood or program switch takes effect
+immediately unless a queued GIF is playing. The server runs on its own event loop thread
+in the player; the bot uses request_async(), everything else request().
+
+Usage:
+    python3 control.py status
+    python3 control.py brightness 0.4
+    python3 control.py program plasma
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from collections.abc import Callable
+from typing import Any
+
+import notify
+import text_queue as txt_q
+import thequeue as q
+from config import Constants, Main_Options as Options
+
+logger = logging.getLogger('blinky.control')
+
+
+def apply(cmd: str, value: Any = None, programs: list[str] | None = None, moods: list[str] | None = None) -> dict:
+    """Change the setting behind cmd in Options. Shared by the server and callers without a player.
+
+    Program and mood names are checked against programs and moods when given.
+    """
+    if cmd == 'brightness':
+        try:
+            brightness = float(value)
+        except (TypeError, ValueError):
+            return {'ok': False, 'error': f'Brightness must be a number, not {value!r}'}
+        if not 0 <= brightness <= 1:
+            return {'ok': False, 'error': 'Brightness must be between 0 and 1'}
+        Options.brightness = brightness
+    elif cmd == 'mood':
+        if not value or not isinstance(value, str):
+            return {'ok': False, 'error': 'Which mood?'}
+        if moods is not None and value not in moods:
+            return {'ok': False, 'error': f"Unknown mood '{value}'. Available: {', '.join(moods)}"}
+        Options.mood = value
+        Options.playlistmode = 'mood'
+    elif cmd == 'program':
+        name = value or ''
+        if name and programs is not None and name not in programs:
+            return {'ok': False, 'error': f"Unknown program '{name}'. Available: {', '.join(programs)}"}
+        Options.program = name
+        Options.playlistmode = 'programmatic'
+    else:
+        return {'ok': False, 'error': f'Unknown command {cmd!r}'}
+    return {'ok': True}
+
+
+class ControlServer:
+    """Serves the control socket for the player.
+
+    status returns what is on the wall ('playing' and whether it is 'user_content', a
+    queued GIF that switches must not cut short); programs and moods list the program
+    and mood names.
+    """
+
+    def __init__(self, status: Callable[[], dict], programs: Callable[[], list[str]],
+                 moods: Callable[[], list[str]]):
+        self._status = status
+        self._programs = programs
+        self._moods = moods
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+
+    def handle(self, cmd: str, value: Any = None) -> dict:
+        if cmd == 'status':
+            return {
+                'ok': True,
+                **self._status(),
+                'playlistmode': Options.playlistmode,
+                'mood': Options.mood,
+                'pattern': Options.pattern,
+                'program': Options.program,
+                'brightness': Options.brightness,
+                'queued_gifs': q.size(),
+                'queued_text': txt_q.size(),
+            }
+        if cmd == 'skip':
+            notify.notify('skip')
+            return {'ok': True}
+        reply = apply(cmd, value, self._programs() if cmd == 'program' else None,
+                      self._moods() if cmd == 'mood' else None)
+        if reply['ok'] and cmd in ('mood', 'program') and not self._status().get('user_content'):
+            notify.notify('skip')
+        return reply
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    reply = self.handle(request['cmd'], request.get('value'))
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'ok': False, 'error': f'Bad request: {e}'}
+                except Exception as e:
+                    logger.exception('Control request %r failed', line)
+                    reply = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self, started: threading.Event) -> None:
+        path = str(Constants.control_socket)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        logger.info('Control socket listening on %s', path)
+        started.set()
+        async with self._server:
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._server.serve_forever()
+
+    def start(self) -> None:
+        """Serve on a daemon thread; returns once the socket accepts connections."""
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(started),),
+                                  name='control', daemon=True)
+        thread.start()
+        started.wait(5)
+
+    def close(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+def _encode(cmd: str, value: Any) -> bytes:
+    request = {'cmd': cmd} if value is None else {'cmd': cmd, 'value': value}
+    return json.dumps(request).encode() + b'\n'
+
+
+def request(cmd: str, value: Any = None, timeout: float = 2) -> dict:
+    """Send one command to the player. Raises OSError when the player is not running."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(Constants.control_socket))
+        sock.sendall(_encode(cmd, value))
+        with sock.makefile('rb') as replies:
+            line = replies.readline()
+    if not line:
+        raise ConnectionError('The player closed the control socket')
+    return json.loads(line)
+
+
+async def request_async(cmd: str, value: Any = None, timeout: float = 2) -> dict:
+    """request() for asyncio callers."""
+    async def exchange() -> bytes:
+        reader, writer = await asyncio.open_unix_connection(str(Constants.control_socket))
+        try:
+            writer.write(_encode(cmd, value))
+            await writer.drain()
+            return await reader.readline()
+        finally:
+            writer.close()
+
+    try:
+        line = await asyncio.wait_for(exchange(), timeout)
+    except asyncio.TimeoutError as e:
+        raise TimeoutError('The player did not answer') from e
+    if not line:
+        raise ConnectionError('The player closed the control socket')
+    return json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Control the running player')
+    parser.add_argument('cmd', choices=['skip', 'brightness', 'program', 'mood', 'status'])
+    parser.add_argument('value', nargs='?', help='brightness 0-1, program or mood name')
+    args = parser.parse_args()
+    try:
+        reply = request(args.cmd, args.value)
+    except OSError as e:
+        sys.exit(f'Player not reachable on {Constants.control_socket}: {e}')
+    print(json.dumps(reply, indent=2))
+    if not reply.get('ok'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 import logging
 import os
+import threading
 import time
 from abc import ABC, abstractmethod
+from collections import deque
 from collections.abc import Sequence
 
-import board
+import numpy as np
 
 import layout
 from config import Main_Options as Options
@@ -14,13 +16,32 @@ logger = logging.getLogger("blinky.display")
 _MACHINE = os.uname().machine
 IS_ARM: bool = _MACHINE.startswith("arm") or _MACHINE == "aarch64"
 
+# Pixels with every channel at or below this level are switched off entirely
+BLACK_THRESHOLD = 3
+
+
+def output_lut(brightness: float, gamma: float = 1.0) -> np.ndarray:
+    """256-entry table mapping an input channel level to its brightness and gamma corrected output."""
+    levels = np.arange(256) / 255
+    return np.clip(255 * brightness * levels ** gamma, 0, 255).astype(np.uint8)
+
 
 class Display(ABC):
-    """Common interface shared by NeoPixelDisplay and PyGameDisplay."""
+    """Common interface shared by NeoPixelDisplay, PyGameDisplay and the headless displays."""
 
     @abstractmethod
     def set_xy(self, x: int, y: int, color: Sequence[float]) -> None: ...
 
+    def set_frame(self, frame: np.ndarray) -> None:
+        """Set every pixel from an HxWx3 uint8 array.
+
+        Falls back to one set_xy call per pixel; backends override this with a bulk path.
+        """
+        height, width = frame.shape[:2]
+        for y in range(height):
+            for x in range(width):
+                self.set_xy(x, y, frame[y, x].tolist())
+
     @abstractmethod
     def show(self) -> str | None: ...
 
@@ -30,62 +51,103 @@ class Display(ABC):
     @abstractmethod
     def set_brightness(self) -> None: ...
 
+    def close(self) -> None:
+        """Release threads or hardware held by the display."""
+
 
 class NeoPixelDisplay(Display):
+    """WS2812 strip output.
+
+    show() only pushes to the strip when the LED data differs from the last pushed
+    frame; frames_pushed and frames_skipped count both outcomes.
+    """
     resolution: tuple[int, int]
     led_count: int
 
     def __init__(self, led_count: int, x_boxes: int, y_boxes: int, rotate_90: bool):
 
         if IS_ARM:
+            board = __import__("board")
             self.strip = __import__("neopixel").NeoPixel(board.D18, led_count, brightness=1, auto_write=False)
+            # The strip's byte buffer, viewed as one row per LED: adafruit_pixelbuf stores each
+            # LED in the strip's byte order after a header of _offset bytes, and at brightness 1
+            # sends it as it is. show() writes frames here instead of through the per-LED setter.
+            self._strip_pixels = np.frombuffer(self.strip._post_brightness_buffer, dtype=np.uint8,
+                                               count=led_count * 3, offset=self.strip._offset).reshape(led_count, 3)
+            self._strip_order = np.argsort(self.strip._byteorder[:3])
         else:
             self.strip = [None] * led_count
         self.matrix = layout.full_layout(x_boxes, y_boxes, rotate_90=rotate_90)
+        # Flat frame index feeding each LED, so a whole frame maps onto the strip in one gather
+        self._led_order = np.argsort(self.matrix, axis=None)
+        # Strip contents in LED order; pushed to the strip on show()
+        self._pixels = np.zeros((led_count, 3), dtype=np.uint8)
+        self._shown: np.ndarray | None = None
+        self.frames_pushed = 0
+        self.frames_skipped = 0
         self.resolution = (x_boxes * 5, y_boxes * 4) if not rotate_90 else (x_boxes * 4, y_boxes * 5)
         self.led_count = led_count
-        self.brightness = Options.brightness
-        self.led_type = Options.led_type
+        self._lut_key: tuple | None = None
+        self._update_lut()
 
     def is_running(self) -> bool:
         return True
 
     def show(self):
+        if self._shown is not None and np.array_equal(self._pixels, self._shown):
+            self.frames_skipped += 1
+            return None
+        self._shown = self._pixels.copy()
+        self.frames_pushed += 1
         if not IS_ARM:
+            self.strip[:] = self._pixels.tolist()
             logger.error("Not an ARM thing!")
             return None
+        np.take(self._pixels, self._strip_order, axis=1, out=self._strip_pixels)
         self.strip.show()
         return None
 
     def set_brightness(self):
-        self.brightness = Options.brightness
+        self._update_lut()
+
+    def _update_lut(self) -> None:
+        """Rebuild the output tables, but only when brightness, gamma or LED type changed."""
+        key = (Options.brightness, Options.gamma, Options.led_type)
+        if key == self._lut_key:
+            return
+        self.brightness, gamma, self.led_type = key
+        self._lut = output_lut(self.brightness, gamma)
+        self._channels = np.array([1, 0, 2] if self.led_type == 'grb' else [0, 1, 2])
+        # Byte offsets into a flattened frame, already in strip LED and channel order
+        self._byte_order = (self._led_order[:, None] * 3 + self._channels).ravel()
+        self._lut_key = key
 
     def set_xy(self, x: int, y: int, value: Sequence[float]) -> None:
         led_id = self.matrix[y][x]
         logger.debug('set_xy x: %s, y: %s, val: %s, id: %s', x, y, value, led_id)
-        dark = all(ch <= 3 for ch in value)
-        rgb: tuple[float, float, float] = (0, 0, 0) if dark else (value[0], value[1], value[2])
-
-        if self.led_type == 'grb':
-            rgb = (rgb[1], rgb[0], rgb[2])
+        levels = np.clip(np.asarray(value[:3]), 0, 255).astype(np.uint8)
+        if (levels <= BLACK_THRESHOLD).all():
+            self._pixels[led_id] = 0
+        else:
+            self._pixels[led_id] = self._lut[levels[self._channels]]
 
-        self.strip[led_id] = tuple(self.brightness * ch for ch in rgb)
+    def set_frame(self, frame: np.ndarray) -> None:
+        levels = np.asarray(frame, dtype=np.uint8).reshape(-1)[self._byte_order].reshape(-1, 3)
+        pixels = self._lut[levels]
+        pixels[(levels <= BLACK_THRESHOLD).all(axis=1)] = 0
+        self._pixels[:] = pixels
 
     def flash(self):
-        for i in range(self.led_count):
-            self.strip[i] = (255, 255, 255)
+        self._pixels[:] = (255, 255, 255)
         self.show()
         time.sleep(0.5)
-        for i in range(self.led_count):
-            self.strip[i] = (0, 0, 0)
+        self._pixels[:] = (0, 0, 0)
         self.show()
         time.sleep(0.5)
-        for i in range(self.led_count):
-            self.strip[i] = (255, 255, 255)
+        self._pixels[:] = (255, 255, 255)
         self.show()
         time.sleep(0.5)
-        for i in range(self.led_count):
-            self.strip[i] = (0, 0, 0)
+        self._pixels[:] = (0, 0, 0)
         self.show()
 
     def run_debug(self):
@@ -93,23 +155,23 @@ class NeoPixelDisplay(Display):
         try:
             while True:
                 for i in range(self.led_count):
-                    self.strip[i] = (255, 255, 255)
+                    self._pixels[i] = (255, 255, 255)
                     self.show()
                     time.sleep(delay)
                 for i in range(self.led_count):
-                    self.strip[i] = (0, 0, 0)
+                    self._pixels[i] = (0, 0, 0)
                     self.show()
                     time.sleep(delay)
                 for i in range(self.led_count):
-                    self.strip[i] = (255, 0, 0)
+                    self._pixels[i] = (255, 0, 0)
                     self.show()
                     time.sleep(delay)
                 for i in range(self.led_count):
-                    self.strip[i] = (0, 255, 0)
+                    self._pixels[i] = (0, 255, 0)
                     self.show()
                     time.sleep(delay)
                 for i in range(self.led_count):
-                    self.strip[i] = (0, 0, 255)
+                    self._pixels[i] = (0, 0, 255)
                     self.show()
                     time.sleep(delay)
         except KeyboardInterrupt:
@@ -117,21 +179,44 @@ class NeoPixelDisplay(Display):
 
 
 class PyGameDisplay(Display):
+    """Development window.
 
-    def __init__(self, x_pixels, y_pixels, pixel_size):
+    Frames are written into a surface with one pixel per LED and scaled up to the window
+    with a single transform.scale call. grid and led_look draw a precomputed overlay mask
+    on top that imitates the crate grid and round LED dots.
+    """
+
+    def __init__(self, x_pixels, y_pixels, pixel_size, grid: bool = False, led_look: bool = False):
         self.pg = __import__("pygame")
         pg = self.pg
         pg.init()
         surface_x = x_pixels * pixel_size
         surface_y = y_pixels * pixel_size
         pg.display.set_mode((surface_x, surface_y))
-        self.surface = pg.Surface((surface_x, surface_y))
+        self.surface = pg.Surface((x_pixels, y_pixels))
         pg.display.flip()
         self.pixel_size = pixel_size
         self.x_pixels = x_pixels
         self.y_pixels = y_pixels
+        self.overlay = self._build_overlay(grid, led_look) if grid or led_look else None
         self.running = True
         self.brightness = Options.brightness
+        self._lut = output_lut(self.brightness)
+
+    def _build_overlay(self, grid: bool, led_look: bool):
+        pg = self.pg
+        size = self.pixel_size
+        cell = pg.Surface((size, size), pg.SRCALPHA)
+        if led_look:
+            cell.fill((0, 0, 0, 255))
+            pg.draw.circle(cell, (0, 0, 0, 0), (size / 2, size / 2), size / 2 - 1)
+        if grid:
+            pg.draw.rect(cell, (40, 40, 40, 255), cell.get_rect(), 1)
+        overlay = pg.Surface((self.x_pixels * size, self.y_pixels * size), pg.SRCALPHA)
+        for y in range(self.y_pixels):
+            for x in range(self.x_pixels):
+                overlay.blit(cell, (x * size, y * size))
+        return overlay
 
     def is_running(self):
         return self.running
@@ -157,16 +242,171 @@ class PyGameDisplay(Display):
     def show(self):
         pg = self.pg
         screen = pg.display.get_surface()
-        screen.blit(self.surface, (0, 0))
+        pg.transform.scale(self.surface, screen.get_size(), screen)
+        if self.overlay is not None:
+            screen.blit(self.overlay, (0, 0))
         pg.display.flip()
         command = self.process_events()
         return command
 
     def set_brightness(self):
-        self.brightness = Options.brightness
+        if Options.brightness != self.brightness:
+            self.brightness = Options.brightness
+            self._lut = output_lut(self.brightness)
+
+    def set_xy(self, x: int, y: int, color: Sequence[float]) -> None:
+        levels = np.clip(np.asarray(color[:3]), 0, 255).astype(np.uint8)
+        self.surface.set_at((x, y), self._lut[levels].tolist())
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        levels = self._lut[np.asarray(frame, dtype=np.uint8)]
+        self.pg.surfarray.blit_array(self.surface, levels.swapaxes(0, 1))
+
+
+class ThreadedDisplay(Display):
+    """Feeds another display from a dedicated output thread.
+
+    Producers draw into the back buffer and show() swaps it with the front slot, returning
+    immediately. The output thread pushes the front slot at a fixed cadence. A frame swapped
+    out before it was pushed counts as dropped, a push that overruns its slot as late.
+    """
+
+    def __init__(self, display: Display, resolution: tuple[int, int], fps: float = 60):
+        width, height = resolution
+        self.display = display
+        self._back = np.zeros((height, width, 3), dtype=np.uint8)
+        self._front = np.zeros_like(self._back)
+        self._pending = False
+        self._running = True
+        self._period = 1 / fps
+        self._cond = threading.Condition()
+        self.frames_pushed = 0
+        self.frames_dropped = 0
+        self.frames_late = 0
+        self._thread = threading.Thread(target=self._run, name='display_output', daemon=True)
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._running and self.display.is_running()
+
+    def set_brightness(self) -> None:
+        # The output thread refreshes the wrapped display's brightness before every push
+        pass
+
+    def set_xy(self, x: int, y: int, color: Sequence[float]) -> None:
+        self._back[y, x] = np.clip(np.asarray(color[:3]), 0, 255)
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        self._back[:] = frame
+
+    def show(self) -> None:
+        with self._cond:
+            if self._pending:
+                self.frames_dropped += 1
+            self._back, self._front = self._front, self._back
+            self._pending = True
+            self._cond.notify()
+        # Keep drawing on top of the frame just handed over, like a single buffer would
+        self._back[:] = self._front
+        return None
+
+    def close(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=1)
+        logger.info('Output thread stopped: %d pushed, %d dropped, %d late',
+                    self.frames_pushed, self.frames_dropped, self.frames_late)
+
+    def _run(self) -> None:
+        deadline = time.monotonic()
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                deadline = max(deadline, time.monotonic())
+                self.display.set_brightness()
+                self.display.set_frame(self._front)
+                self._pending = False
+            self.display.show()
+            self.frames_pushed += 1
+            deadline += self._period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.frames_late += 1
+
+
+class NullDisplay(Display):
+    """Headless display for benchmarks and CI.
+
+    Keeps the latest frame in memory, counts show() calls and records the time between
+    consecutive frames. With max_frames set, is_running() turns False once that many
+    frames were shown so players stop on their own.
+    """
+
+    def __init__(self, x_pixels: int, y_pixels: int, max_frames: int | None = None, history: int = 1000):
+        self.resolution = (x_pixels, y_pixels)
+        self.frame = np.zeros((y_pixels, x_pixels, 3), dtype=np.uint8)
+        self.frame_count = 0
+        self.frame_times: deque[float] = deque(maxlen=history)
+        self.max_frames = max_frames
+        self._last_show: float | None = None
+
+    def is_running(self) -> bool:
+        return self.max_frames is None or self.frame_count < self.max_frames
+
+    def set_brightness(self) -> None:
+        pass
 
     def set_xy(self, x: int, y: int, color: Sequence[float]) -> None:
-        x_offset = x * self.pixel_size
-        y_offset = y * self.pixel_size
-        scaled = tuple(self.brightness * ch for ch in color)
-        self.pg.draw.rect(self.surface, scaled, self.pg.Rect(x_offset, y_offset, self.pixel_size, self.pixel_size))
+        self.frame[y, x] = np.clip(np.asarray(color[:3]), 0, 255)
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        self.frame[:] = frame
+
+    def show(self) -> None:
+        now = time.perf_counter()
+        if self._last_show is not None:
+            self.frame_times.append(now - self._last_show)
+        self._last_show = now
+        self.frame_count += 1
+        return None
+
+    def fps(self) -> float:
+        """Average frame rate over the recorded frame times."""
+        if not self.frame_times:
+            return 0.0
+        return len(self.frame_times) / sum(self.frame_times)
+
+
+class RecordingDisplay(NullDisplay):
+    """NullDisplay that also keeps the last `capacity` frames in a preallocated ring buffer.
+
+    With a path the ring buffer is a memory-mapped .npy file that can be inspected
+    with numpy.load while or after the player runs.
+    """
+
+    def __init__(self, x_pixels: int, y_pixels: int, capacity: int = 1000, path: str | None = None,
+                 max_frames: int | None = None):
+        super().__init__(x_pixels, y_pixels, max_frames=max_frames, history=capacity)
+        shape = (capacity, y_pixels, x_pixels, 3)
+        self.frames: np.ndarray
+        if path:
+            self.frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+        else:
+            self.frames = np.zeros(shape, dtype=np.uint8)
+
+    def show(self) -> None:
+        self.frames[self.frame_count % len(self.frames)] = self.frame
+        return super().show()
+
+    def recorded(self) -> np.ndarray:
+        """Recorded frames, oldest first."""
+        capacity = len(self.frames)
+        if self.frame_count <= capacity:
+            return self.frames[:self.frame_count]
+        return np.roll(self.frames, -(self.frame_count % capacity), axis=0)
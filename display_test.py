@@ -3,6 +3,8 @@
 import sys
 import time
 
+import numpy as np
+
 from display import PyGameDisplay
 
 COLORS = [
@@ -19,15 +21,15 @@ HOLD_SECONDS = 0.5
 
 
 def main():
-    display = PyGameDisplay(x_pixels=25, y_pixels=12, pixel_size=30)
+    display = PyGameDisplay(x_pixels=25, y_pixels=12, pixel_size=30, led_look=True)
 
     try:
         for color in COLORS:
             if not display.is_running():
                 break
-            for y in range(display.y_pixels):
-                for x in range(display.x_pixels):
-                    display.set_xy(x, y, color)
+            frame = np.empty((display.y_pixels, display.x_pixels, 3), dtype=np.uint8)
+            frame[:] = color
+            display.set_frame(frame)
             display.show()
             deadline = time.monotonic() + HOLD_SECONDS
             while time.monotonic() < deadline and display.is_running():
@@ -0,0 +1,144 @@
+"""Fair queue of strings in an SQLite database in WAL mode, shared by threads and processes.
+
+Items are served round-robin by sender: a sender's n-th waiting item is served in round n,
+after every other sender's item of an earlier round, so one busy sender cannot push
+everyone else back. Each item carries a cost, the seconds it will occupy the display,
+from which put() estimates when it will start.
+
+Enqueue and dequeue touch one row each through indexes, so their cost does not grow with
+the queue. Every operation is its own committed transaction: an item taken is gone for
+good and an item put survives a restart or power cut. Each thread of each process gets
+its own connection.
+"""
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+logger = logging.getLogger('blinky.durable_queue')
+
+
+class QueueFull(Exception):
+    """The sender, or the queue as a whole, has as many items waiting as allowed."""
+
+
+class DurableQueue:
+    """Queue stored at path. Lines of a legacy text file queue, if given, are moved in once."""
+
+    def __init__(self, path: str | Path, legacy: str | Path | None = None, timeout: float = 10):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)')
+            columns = {row[1] for row in db.execute('PRAGMA table_info(items)')}
+            # Queues created before fair scheduling only have id and payload
+            for column, definition in (('sender', "TEXT NOT NULL DEFAULT ''"),
+                                       ('round', 'INTEGER NOT NULL DEFAULT 0'),
+                                       ('cost', 'REAL NOT NULL DEFAULT 0')):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE items ADD COLUMN {column} {definition}')
+            db.execute('CREATE INDEX IF NOT EXISTS items_order ON items (round, id)')
+            db.execute('CREATE INDEX IF NOT EXISTS items_sender ON items (sender, round)')
+            db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL)')
+            db.execute('CREATE TABLE IF NOT EXISTS migrated (path TEXT PRIMARY KEY)')
+        if legacy is not None:
+            self._migrate(str(legacy))
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=FULL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _migrate(self, legacy: str) -> None:
+        """Import the lines of a legacy queue file. Recorded in the same transaction, so never twice."""
+        if not os.path.exists(legacy):
+            return
+        with self._transaction() as db:
+            if db.execute('SELECT 1 FROM migrated WHERE path = ?', (legacy,)).fetchone() is None:
+                with open(legacy, encoding='utf-8') as f:
+                    lines = [line.rstrip('\n') for line in f if line.strip()]
+                db.executemany('INSERT INTO items (payload) VALUES (?)', [(line,) for line in lines])
+                db.execute('INSERT INTO migrated (path) VALUES (?)', (legacy,))
+                logger.info('Moved %d items from %s into %s', len(lines), legacy, self.path)
+        with contextlib.suppress(FileNotFoundError):
+            os.replace(legacy, f'{legacy}.migrated')
+
+    @staticmethod
+    def _state(db: sqlite3.Connection, key: str) -> float:
+        row = db.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _eta(self, db: sqlite3.Connection, round_: int, item_id: int) -> float:
+        """Seconds until the item at (round_, item_id) starts: what is left of the last item taken plus all ahead."""
+        ahead = db.execute('SELECT COALESCE(SUM(cost), 0) FROM items WHERE (round, id) < (?, ?)',
+                           (round_, item_id)).fetchone()[0]
+        remaining = self._state(db, 'taken_cost') - (time.time() - self._state(db, 'taken_at'))
+        return ahead + max(0.0, remaining)
+
+    def put(self, payload: str, sender: str = '', cost: float = 0, max_per_sender: int | None = None,
+            max_total: int | None = None, coalesce: bool = False) -> float:
+        """Queue payload and return the estimated seconds until it starts.
+
+        Raises QueueFull when sender already has max_per_sender items waiting or the queue
+        max_total. With coalesce, a payload the sender already has waiting is not added
+        again and the estimate for the waiting one is returned.
+        """
+        with self._transaction() as db:
+            if coalesce:
+                row = db.execute('SELECT round, id FROM items WHERE sender = ? AND payload = ?',
+                                 (sender, payload)).fetchone()
+                if row is not None:
+                    return self._eta(db, *row)
+            waiting, last_round = db.execute('SELECT COUNT(*), MAX(round) FROM items WHERE sender = ?',
+                                             (sender,)).fetchone()
+            if max_per_sender is not None and waiting >= max_per_sender:
+                raise QueueFull(f'{waiting} items of this sender are already waiting')
+            if max_total is not None and len(self) >= max_total:
+                raise QueueFull('The queue is full')
+            # A sender's next item goes one round after its last waiting one, a new sender joins
+            # the round after the one being served
+            round_ = (last_round if last_round is not None else int(self._state(db, 'round'))) + 1
+            item_id = db.execute('INSERT INTO items (payload, sender, round, cost) VALUES (?, ?, ?, ?)',
+                                 (payload, sender, round_, cost)).lastrowid
+            if item_id is None:
+                raise sqlite3.DatabaseError('The insert reported no row id')
+            return self._eta(db, round_, item_id)
+
+    def take(self) -> str | None:
+        """Remove and return the next item, None when the queue is empty."""
+        with self._transaction() as db:
+            row = db.execute('SELECT id, payload, round, cost FROM items ORDER BY round, id LIMIT 1').fetchone()
+            if row is None:
+                return None
+            item_id, payload, round_, cost = row
+            db.execute('DELETE FROM items WHERE id = ?', (item_id,))
+            db.executemany('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                           [('round', round_), ('taken_cost', cost), ('taken_at', time.time())])
+            return payload
+
+    def has_items(self) -> bool:
+        return self._connection().execute('SELECT 1 FROM items LIMIT 1').fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM items').fetchone()[0]
@@ -0,0 +1,124 @@
+"""Decoded GIF frames kept in memory and evicted least-recently-used by a byte budget."""
+import dataclasses
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import IO, Literal
+
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence
+
+logger = logging.getLogger('blinky.cache')
+
+# GIF frame delays at or below this are treated as unset, as browsers do
+MIN_GIF_DURATION_MS = 10
+DEFAULT_GIF_DURATION_MS = 100
+
+ResizeMode = Literal['fit', 'cut', 'scale']
+
+
+@dataclasses.dataclass(frozen=True)
+class Animation:
+    frames: np.ndarray  # (n, height, width, 3) uint8 at display resolution
+    durations: np.ndarray  # (n,) playback time per frame in ms
+    still: bool = False  # a photo without frame timing
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.durations.nbytes
+
+
+def resize(image: Image.Image, resolution: tuple[int, int], mode: ResizeMode = 'cut') -> Image.Image:
+    """Bring an image to resolution.
+
+    fit: scale to fit inside, keeping the aspect ratio, and pad with black
+    cut: crop the centre, padding with black where the image is smaller
+    scale: stretch to exactly resolution
+    """
+    if image.size == resolution:
+        return image
+    if mode == 'scale':
+        return image.resize(resolution, Image.Resampling.LANCZOS)
+    if mode == 'fit':
+        image = ImageOps.contain(image, resolution, Image.Resampling.LANCZOS)
+    canvas = Image.new('RGB', resolution)
+    canvas.paste(image, ((resolution[0] - image.width) // 2, (resolution[1] - image.height) // 2))
+    return canvas
+
+
+def _frame_duration(info: dict) -> float:
+    duration = info.get('duration')
+    if not isinstance(duration, (int, float)) or duration <= MIN_GIF_DURATION_MS:
+        return DEFAULT_GIF_DURATION_MS
+    return duration
+
+
+def decode(path: str | IO[bytes], resolution: tuple[int, int], mode: ResizeMode = 'cut') -> Animation:
+    """Decode every frame of an image file or file object into uint8 RGB arrays at resolution."""
+    with Image.open(path) as img:
+        if mode != 'cut':
+            # JPEGs then decode at the smallest fraction of their size still covering resolution
+            img.draft('RGB', resolution)
+        still = 'duration' not in img.info
+        frames = []
+        durations = []
+        for frame in ImageSequence.Iterator(img):
+            frames.append(np.asarray(resize(frame.convert('RGB'), resolution, mode)))
+            durations.append(_frame_duration(frame.info))
+    return Animation(np.stack(frames), np.array(durations, dtype=np.int32), still)
+
+
+def duration_ms(path: str) -> float | None:
+    """Time of one pass through an animation, timed as decode() times it; None for a still image."""
+    with Image.open(path) as img:
+        if 'duration' not in img.info:
+            return None
+        return sum(_frame_duration(frame.info) for frame in ImageSequence.Iterator(img))
+
+
+class FrameCache:
+    """Decoded animations keyed by path, modification time, resolution and resize mode."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, Animation] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, resolution: tuple[int, int], mode: ResizeMode = 'cut') -> Animation:
+        key = (path, os.stat(path).st_mtime_ns, resolution, mode)
+        with self._lock:
+            animation = self._entries.get(key)
+            if animation is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return animation
+            self.misses += 1
+        animation = decode(path, resolution, mode)
+        self._store(key, animation)
+        return animation
+
+    def _store(self, key: tuple, animation: Animation) -> None:
+        if animation.nbytes > self.budget_bytes:
+            logger.debug('Not caching %s: %d bytes exceed the budget', key[0], animation.nbytes)
+            return
+        with self._lock:
+            # Drop versions of the same file from before it was modified
+            for stale in [k for k in self._entries if k[0] == key[0]]:
+                self._size -= self._entries.pop(stale).nbytes
+            self._entries[key] = animation
+            self._size += animation.nbytes
+            while self._size > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Bytes currently held."""
+        return self._size
@@ -0,0 +1,54 @@
+"""Deadline based frame pacing shared by the GIF and programmatic players."""
+import time
+from collections import deque
+from typing import Literal
+
+Policy = Literal['drop', 'catch_up']
+
+
+class FrameClock:
+    """Paces frames against time.monotonic() deadlines.
+
+    wait() sleeps until the end of the current frame's slot, so render and output time are
+    absorbed by the schedule instead of being added on top of the frame delay. When a frame
+    overruns its slot, 'drop' restarts the schedule from now (the missed slots are lost) while
+    'catch_up' keeps it and runs the next frames back to back until it is on time again,
+    up to max_lag seconds behind.
+    """
+
+    def __init__(self, fps: float = 30, policy: Policy = 'drop', max_lag: float = 0.5, history: int = 60):
+        self.period = 1 / fps
+        self.policy = policy
+        self.max_lag = max_lag
+        self.drift = 0.0
+        self.frames_late = 0
+        self._deadline: float | None = None
+        self._ticks: deque[float] = deque(maxlen=history)
+
+    def reset(self) -> None:
+        """Start a new schedule, e.g. when switching to another GIF or program."""
+        self._deadline = None
+        self._ticks.clear()
+
+    def wait(self, duration: float | None = None) -> None:
+        """End the current frame after `duration` seconds (one period by default) since the last one."""
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        self._deadline += self.period if duration is None else duration
+        # Positive drift: we are behind schedule
+        self.drift = now - self._deadline
+        if self.drift <= 0:
+            time.sleep(-self.drift)
+        else:
+            self.frames_late += 1
+            if self.policy == 'drop' or self.drift > self.max_lag:
+                self._deadline = now
+        self._ticks.append(time.monotonic())
+
+    @property
+    def achieved_fps(self) -> float:
+        """Frame rate over the last `history` frames."""
+        if len(self._ticks) < 2:
+            return 0.0
+        return (len(self._ticks) - 1) / (self._ticks[-1] - self._ticks[0])
@@ -0,0 +1,234 @@
+"""Converting uploaded media for the display on worker processes, off the bot's event loop.
+
+Uploads arrive as bytes and never touch the disk: photos and small GIFs are decoded
+by Pillow from memory, video is handed to FFmpeg through an in-memory file and read back
+as raw frames at display resolution. Either way the only file written is the playback
+file the player maps. With Options.video_mode 'stream' videos are stored unconverted
+instead, and the player decodes them as it plays them (see video.py).
+
+Jobs wait in the pool's queue and run on a fixed number of workers at a lower CPU
+priority, so conversions neither stall the bot nor take the render thread's share of a
+Pi. The number of jobs waiting or running is capped; beyond that submit() refuses.
+
+Results are kept in a MediaCache keyed by the uploaded bytes and the conversion
+settings, so a sticker or meme sent again is queued at once without another conversion.
+"""
+import contextlib
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import playback
+import video
+from durable_queue import QueueFull
+from frame_cache import Animation, decode
+from variants import lower_priority
+
+logger = logging.getLogger('blinky.ingest')
+
+# Part of every cache key: bump when the conversion output changes
+TRANSCODE_VERSION = 2
+
+# Leading bytes of the formats Pillow converts; GIFs only up to NATIVE_GIF_BYTES
+NATIVE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+NATIVE_GIF_BYTES = 2 * 1024 * 1024
+
+
+def is_native(data: bytes) -> bool:
+    """Whether data is a photo or a small GIF, judged by its content."""
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return len(data) <= NATIVE_GIF_BYTES
+    return data.startswith(NATIVE_SIGNATURES)
+
+
+def convert(data: bytes, out: str, resolution: tuple[int, int]) -> str:
+    """Scale an image to resolution with Pillow into a playback file. Runs in a worker."""
+    # Stretched like FFmpeg's -s, so the result does not depend on the kind of upload
+    playback.write(out, decode(io.BytesIO(data), resolution, 'scale'), 'scale')
+    return out
+
+
+@contextlib.contextmanager
+def _memory_file(data: bytes):
+    """A path FFmpeg can read and seek data through, without writing it to disk where possible.
+
+    MP4s with their index at the end need seeking, which a pipe does not allow.
+    """
+    if not hasattr(os, 'memfd_create'):
+        # Not Linux: fall back to a pipe, which works for streamable files
+        yield 'pipe:0', data, ()
+        return
+    fd = os.memfd_create('upload')
+    try:
+        os.write(fd, data)
+        yield f'/dev/fd/{fd}', None, (fd,)
+    finally:
+        os.close(fd)
+
+
+def transcode(data: bytes, out: str, resolution: tuple[int, int]) -> str:
+    """Decode video with FFmpeg into frames at resolution and write them as a playback file. Runs in a worker."""
+    from ffmpy import FFmpeg
+
+    width, height = resolution
+    with _memory_file(data) as (source, input_data, pass_fds):
+        frames, _ = FFmpeg(
+            inputs={source: '-hide_banner -loglevel error'},
+            outputs={'pipe:1': video.output_options(resolution)},
+        ).run(input_data=input_data, stdout=subprocess.PIPE, pass_fds=pass_fds)
+    frames = np.frombuffer(frames, dtype=np.uint8).reshape(-1, height, width, 3)
+    if not len(frames):
+        raise ValueError('FFmpeg decoded no frames')
+    durations = np.full(len(frames), 1000 // video.FPS, dtype=np.int32)
+    playback.write(out, Animation(frames, durations), 'scale')
+    return out
+
+
+class MediaCache:
+    """Converted files named by content key, evicted least recently used beyond budget_bytes."""
+
+    def __init__(self, root: str | Path, budget_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+
+    def path(self, key: str) -> Path:
+        return self.root / f'{key}{playback.SUFFIX}'
+
+    def lookup(self, key: str) -> Path | None:
+        """The cached file for key, marked as just used."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def trim(self) -> None:
+        entries = [(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                   for entry in os.scandir(self.root) if entry.name.endswith(playback.SUFFIX)]
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.budget_bytes:
+                break
+            # Queued copies are separate links and stay playable
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            size -= entry_size
+
+
+class Ingestor:
+    """Bounded pool of conversion workers delivering to out_dir through a MediaCache."""
+
+    def __init__(self, out_dir: str | Path, resolution: tuple[int, int], cache: MediaCache, workers: int = 1,
+                 max_jobs: int = 8, executor: Executor | None = None):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.resolution = resolution
+        self.cache = cache
+        self.max_jobs = max_jobs
+        self._pending: dict[str, Future[str]] = {}
+        self._lock = threading.Lock()
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=lower_priority,
+        )
+
+    @property
+    def jobs(self) -> int:
+        """Conversions waiting or running."""
+        return len(self._pending)
+
+    def _key(self, data: bytes) -> str:
+        digest = hashlib.sha1(f'{self.resolution[0]}x{self.resolution[1]}:{TRANSCODE_VERSION}:'.encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _deliver(self, cached: str | Path) -> str:
+        """Link the cached file into out_dir, where the player moves it to the graveyard after playing."""
+        out = str(self.out_dir / f'{uuid.uuid4().hex}{playback.SUFFIX}')
+        try:
+            os.link(cached, out)
+        except OSError:
+            shutil.copyfile(cached, out)
+        return out
+
+    def _store_video(self, data: bytes) -> str:
+        """Write a video as it is, for the player to stream."""
+        out = self.out_dir / f'{uuid.uuid4().hex}{video.SUFFIX}'
+        tmp = out.with_suffix('.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, out)
+        return str(out)
+
+    def submit(self, data: bytes, stream_video: bool = False) -> Future[str]:
+        """Convert an upload. Resolves to the path of a playback file in out_dir.
+
+        A cached conversion resolves at once, and an upload identical to one being converted
+        waits for that conversion. With stream_video a video is not converted but stored
+        for the player to decode while playing it. Raises QueueFull when max_jobs
+        conversions are waiting or running already.
+        """
+        result: Future[str] = Future()
+        if stream_video and not is_native(data):
+            result.set_result(self._store_video(data))
+            return result
+        key = self._key(data)
+        if cached := self.cache.lookup(key):
+            try:
+                result.set_result(self._deliver(cached))
+                logger.info('Converted %s before, reusing it', key)
+                return result
+            except FileNotFoundError:
+                # Trimmed by a finishing conversion since the lookup: convert again
+                logger.info('Cached %s was evicted, converting it again', key)
+        with self._lock:
+            conversion = self._pending.get(key)
+            started = conversion is None
+            if conversion is None:
+                if len(self._pending) >= self.max_jobs:
+                    raise QueueFull(f'{len(self._pending)} conversions are waiting already')
+                convert_with = convert if is_native(data) else transcode
+                logger.info('Converting %d bytes with %s', len(data), convert_with.__name__)
+                conversion = self._executor.submit(convert_with, data, str(self.cache.path(key)), self.resolution)
+                self._pending[key] = conversion
+
+        def done(finished: Future[str]) -> None:
+            self._done(key, finished)
+
+        def resolve(finished: Future[str]) -> None:
+            self._resolve(finished, result)
+
+        # Callbacks outside the lock: a finished future runs them right here
+        if started:
+            conversion.add_done_callback(done)
+        conversion.add_done_callback(resolve)
+        return result
+
+    def _resolve(self, conversion: Future[str], result: Future[str]) -> None:
+        try:
+            result.set_result(self._deliver(conversion.result()))
+        except BaseException as e:
+            result.set_exception(e)
+
+    def _done(self, key: str, conversion: Future[str]) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        if conversion.cancelled() or conversion.exception():
+            logger.error('Conversion failed: %s', 'cancelled' if conversion.cancelled() else conversion.exception())
+        else:
+            self.cache.trim()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+"""In-memory index of the background library: moods, files and an inverted filename token index."""
+import dataclasses
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('blinky.library')
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _SEPARATORS.split(text.lower()) if token]
+
+
+@dataclasses.dataclass(frozen=True)
+class Entry:
+    path: str
+    mood: str
+    key: str  # lowercased 'mood/filename' that patterns are matched against
+
+
+class BackgroundLibrary:
+    """Index of <root>/<mood>/*.gif.
+
+    Built once and kept current by refresh(), which only stats the root and the mood
+    directories and rescans a mood when its directory mtime changed. Pattern searches go
+    through an inverted index from filename tokens to entries and are memoized until the
+    next change.
+    """
+
+    def __init__(self, root: str | Path, suffix: str = '.gif'):
+        self.root = Path(root)
+        self.suffix = suffix
+        self._root_mtime: int | None = None
+        self._dir_mtimes: dict[str, int] = {}
+        self._moods: dict[str, list[Entry]] = {}
+        self._index: dict[str, set[Entry]] = {}
+        self._token_matches: dict[str, set[Entry]] = {}
+        self._searches: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Pick up added or removed files. Returns whether anything changed."""
+        with self._lock:
+            changed = False
+            try:
+                root_mtime = os.stat(self.root).st_mtime_ns
+            except FileNotFoundError:
+                root_mtime = None
+            if root_mtime != self._root_mtime:
+                self._root_mtime = root_mtime
+                moods = sorted(entry.name for entry in os.scandir(self.root) if entry.is_dir()) if root_mtime else []
+                for gone in set(self._moods) - set(moods):
+                    del self._moods[gone]
+                    # No mtime when the directory vanished between the scan and its stat
+                    self._dir_mtimes.pop(gone, None)
+                    changed = True
+                for mood in moods:
+                    self._moods.setdefault(mood, [])
+            for mood in list(self._moods):
+                try:
+                    mtime = os.stat(self.root / mood).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if self._dir_mtimes.get(mood) != mtime:
+                    self._dir_mtimes[mood] = mtime
+                    self._moods[mood] = self._scan(mood)
+                    changed = True
+            if changed:
+                self._rebuild_index()
+            return changed
+
+    def _scan(self, mood: str) -> list[Entry]:
+        entries = []
+        for entry in os.scandir(self.root / mood):
+            if entry.name.endswith(self.suffix) and entry.is_file():
+                entries.append(Entry(entry.path, mood, f'{mood}/{entry.name}'.lower()))
+        return sorted(entries, key=lambda e: e.path)
+
+    def _rebuild_index(self) -> None:
+        index: dict[str, set[Entry]] = {}
+        for entries in self._moods.values():
+            for entry in entries:
+                for token in tokenize(entry.key):
+                    index.setdefault(token, set()).add(entry)
+        self._index = index
+        self._token_matches = {}
+        self._searches = {}
+        logger.info('Indexed %d backgrounds in %d moods under %s',
+                    sum(len(e) for e in self._moods.values()), len(self._moods), self.root)
+
+    def moods(self) -> list[str]:
+        return list(self._moods)
+
+    def by_mood(self, mood: str) -> list[str]:
+        return [entry.path for entry in self._moods.get(mood, [])]
+
+    def search(self, pattern: str) -> list[str]:
+        """Paths whose 'mood/filename' contains every space separated word of pattern."""
+        with self._lock:
+            if pattern not in self._searches:
+                self._searches[pattern] = self._search(pattern)
+            return self._searches[pattern]
+
+    def _search(self, pattern: str) -> list[str]:
+        words = [word for word in pattern.lower().split(' ') if word]
+        candidates: set[Entry] | None = None
+        for word in words:
+            for token in tokenize(word):
+                matches = self._entries_with(token)
+                candidates = matches if candidates is None else candidates & matches
+        if candidates is None:
+            candidates = {entry for entries in self._moods.values() for entry in entries}
+        # Words spanning separators ('chill_st') are checked on the few candidates left
+        return sorted(entry.path for entry in candidates if all(word in entry.key for word in words))
+
+    def _entries_with(self, fragment: str) -> set[Entry]:
+        """Entries with a token containing fragment; scans the vocabulary, not the files."""
+        if fragment not in self._token_matches:
+            matches: set[Entry] = set()
+            for token, entries in self._index.items():
+                if fragment in token:
+                    matches |= entries
+            self._token_matches[fragment] = matches
+        return self._token_matches[fragment]
@@ -0,0 +1,79 @@
+"""Queue changes and skips signalled to the player, so its frame loop does not poll.
+
+Each topic is a flag the player checks once per frame, which costs no system call. The
+player process calls listen(); producers in it (the bot thread) set the flag directly,
+producers in other processes (the Flask interface) send the topic name as a datagram to
+the player's Unix socket. Consumers clear the flag before they look at the queue, so a
+change that arrives while they look is seen on the next check.
+"""
+import contextlib
+import logging
+import os
+import socket
+import threading
+
+from config import Constants
+
+logger = logging.getLogger('blinky.notify')
+
+TOPICS = ('gifs', 'text', 'skip')
+
+_events = {topic: threading.Event() for topic in TOPICS}
+# The queues start out changed, so the first check looks at what was queued before a restart
+_events['gifs'].set()
+_events['text'].set()
+_listener_pid: int | None = None
+
+
+def listening() -> bool:
+    """Whether this process receives notifications. Forked children inherit the flag, not the socket."""
+    return _listener_pid == os.getpid()
+
+
+def listen() -> None:
+    """Receive notifications from other processes on Constants.notify_socket."""
+    global _listener_pid
+    path = str(Constants.notify_socket)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    _listener_pid = os.getpid()
+    threading.Thread(target=_receive, args=(sock,), name='notify', daemon=True).start()
+    logger.info('Listening for queue notifications on %s', path)
+
+
+def _receive(sock: socket.socket) -> None:
+    while True:
+        topic = sock.recv(64).decode(errors='replace')
+        if topic in _events:
+            _events[topic].set()
+        else:
+            logger.warning('Unknown notification %r', topic)
+
+
+def notify(topic: str) -> None:
+    """Tell the player that topic changed."""
+    if listening():
+        _events[topic].set()
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(topic.encode(), str(Constants.notify_socket))
+    except OSError as e:
+        # The player is not running; it looks at every queue when it starts
+        logger.debug('Could not notify %s: %s', topic, e)
+
+
+def changed(topic: str) -> bool:
+    """Whether topic may have changed since the last call. Always True outside the listening process."""
+    return not listening() or consume(topic)
+
+
+def consume(topic: str) -> bool:
+    """Whether topic was notified since the last call. Always False outside the listening process."""
+    event = _events[topic]
+    if listening() and event.is_set():
+        event.clear()
+        return True
+    return False
@@ -0,0 +1,61 @@
+"""Text overlay: scrolls a text bitmap and composites it onto frames in one numpy pass."""
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+_dim_luts: dict[float, np.ndarray] = {}
+
+
+def _dim_lut(dim: float) -> np.ndarray:
+    if dim not in _dim_luts:
+        _dim_luts[dim] = np.clip(np.arange(256) * dim, 0, 255).astype(np.uint8)
+    return _dim_luts[dim]
+
+
+def dots_to_bitmap(dots: Sequence[Sequence[int]]) -> np.ndarray:
+    """Boolean (rows, columns) bitmap of a list of [x, y] text dots."""
+    if not len(dots):
+        return np.zeros((0, 0), dtype=bool)
+    xs, ys = np.asarray(dots, dtype=np.intp).T
+    bitmap = np.zeros((ys.max() + 1, xs.max() + 1), dtype=bool)
+    bitmap[ys, xs] = True
+    return bitmap
+
+
+class TextScroller:
+    """Moves a text bitmap from the right edge of the screen off the left edge.
+
+    The bitmap is padded with a screen width of blank columns on both sides once, so each
+    frame's mask is a plain slice no matter how long the message is. The position advances
+    by wall time, so the speed in pixels per second does not depend on the frame rate.
+    """
+
+    def __init__(self, bitmap: np.ndarray, resolution: tuple[int, int]):
+        width, height = resolution
+        rows = min(bitmap.shape[0], height)
+        columns = bitmap.shape[1]
+        self._strip = np.zeros((height, columns + 2 * width), dtype=bool)
+        self._strip[:rows, width:width + columns] = bitmap[:rows]
+        self._width = width
+        self._end = columns + width
+        self._position = 0.0
+        self._last: float | None = None
+
+    def step(self, speed: float, now: float | None = None) -> np.ndarray | None:
+        """Mask for this frame at speed pixels per second, None once the text has left the screen."""
+        now = time.monotonic() if now is None else now
+        if self._last is not None:
+            self._position += (now - self._last) * speed
+        self._last = now
+        offset = int(self._position)
+        if offset > self._end:
+            return None
+        return self._strip[:, offset:offset + self._width]
+
+
+def composite(frame: np.ndarray, mask: np.ndarray, dim: float, color: Sequence[int]) -> np.ndarray:
+    """Dim the background by dim and paint the masked pixels in color."""
+    out = _dim_lut(dim)[np.asarray(frame, dtype=np.uint8)]
+    out[mask] = color
+    return out
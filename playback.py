@@ -0,0 +1,157 @@
+"""Precompiled playback files: raw frames at display resolution, memory-mapped at play time.
+
+A GIF compiles to a sibling file with the SUFFIX extension, adapted to the display with
+a resize mode that is recorded in the file; the player only maps it when the mode is the
+one it plays off-size GIFs with. Layout, little endian:
+
+    header   magic 'FLSH', version, flags, width, height, frame count
+    durations  frame count x uint32, milliseconds
+    frames   frame count x height x width x 3 bytes RGB, starting at a 16 byte boundary
+
+Flags: bit 0 still image, bits 1-2 resize mode (1 fit, 2 cut, 3 scale, 0 not recorded).
+
+Usage:
+    python3 playback.py $WORK_DIR/data/backgrounds/25_12
+    python3 playback.py some/dir --resolution 20x15 --mode fit --force
+"""
+import argparse
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import IO, get_args
+
+import numpy as np
+
+from config import Main_Options as Options
+from frame_cache import Animation, ResizeMode, decode
+
+logger = logging.getLogger('blinky.playback')
+
+SUFFIX = '.frames'
+MAGIC = b'FLSH'
+VERSION = 1
+FLAG_STILL = 1
+MODE_SHIFT = 1
+RESIZE_MODES: tuple[ResizeMode, ...] = get_args(ResizeMode)
+HEADER = struct.Struct('<4sBBHHI')
+
+
+def _data_offset(frame_count: int) -> int:
+    end = HEADER.size + 4 * frame_count
+    return (end + 15) // 16 * 16
+
+
+def compiled_path(path: str | Path) -> Path:
+    return Path(path).with_suffix(SUFFIX)
+
+
+def find_compiled(path: str | Path, mode: ResizeMode | None = None) -> Path | None:
+    """The compiled file for a GIF, if one exists and is not older than the GIF.
+
+    With mode, only a file that was compiled with that resize mode counts.
+    """
+    compiled = compiled_path(path)
+    try:
+        if compiled.stat().st_mtime_ns < os.stat(path).st_mtime_ns:
+            return None
+        if mode is not None and resize_mode(compiled) != mode:
+            return None
+    except (FileNotFoundError, ValueError):
+        return None
+    return compiled
+
+
+def _read_header(f: IO[bytes]) -> tuple[int, int, int, int]:
+    magic, version, flags, width, height, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{f.name} is not a version {VERSION} playback file')
+    return flags, width, height, count
+
+
+def resize_mode(path: str | Path) -> ResizeMode | None:
+    """The resize mode a playback file was written with, None when it was not recorded."""
+    with open(path, 'rb') as f:
+        flags = _read_header(f)[0]
+    code = flags >> MODE_SHIFT & 3
+    return RESIZE_MODES[code - 1] if code else None
+
+
+def write(path: str | Path, animation: Animation, mode: ResizeMode | None = None) -> None:
+    """Write atomically, so a player never maps a half written file.
+
+    mode records how the frames were adapted to their resolution.
+    """
+    count, height, width, _ = animation.frames.shape
+    flags = FLAG_STILL if animation.still else 0
+    if mode is not None:
+        flags |= (RESIZE_MODES.index(mode) + 1) << MODE_SHIFT
+    tmp = Path(f'{path}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, width, height, count))
+        f.write(animation.durations.astype('<u4').tobytes())
+        f.write(b'\0' * (_data_offset(count) - f.tell()))
+        f.write(np.ascontiguousarray(animation.frames, dtype=np.uint8).tobytes())
+    os.replace(tmp, path)
+
+
+def load(path: str | Path) -> Animation:
+    with open(path, 'rb') as f:
+        flags, width, height, count = _read_header(f)
+        durations = np.frombuffer(f.read(4 * count), dtype='<u4').astype(np.int32)
+    frames = np.memmap(path, dtype=np.uint8, mode='r', offset=_data_offset(count),
+                       shape=(count, height, width, 3))
+    return Animation(frames, durations, bool(flags & FLAG_STILL))
+
+
+def compile_file(path: str | Path, resolution: tuple[int, int], mode: ResizeMode) -> Path:
+    out = compiled_path(path)
+    write(out, decode(str(path), resolution, mode), mode)
+    return out
+
+
+def compile_tree(root: Path, resolution: tuple[int, int], mode: ResizeMode, force: bool = False) -> int:
+    """Compile every GIF below root that has no up to date compiled file for mode. Returns the number compiled."""
+    compiled = 0
+    for gif in sorted(root.rglob('*.gif')):
+        if not force and find_compiled(gif, mode):
+            continue
+        try:
+            compile_file(gif, resolution, mode)
+            compiled += 1
+        except Exception:
+            logger.exception('Could not compile %s', gif)
+    return compiled
+
+
+def _resolution_from(root: Path) -> tuple[int, int]:
+    """Read the resolution from a data/backgrounds/<width>_<height> path."""
+    for part in reversed(root.resolve().parts):
+        width, sep, height = part.partition('_')
+        if sep and width.isdigit() and height.isdigit():
+            return int(width), int(height)
+    raise ValueError(f'No <width>_<height> directory in {root}, pass --resolution')
+
+
+def main() -> None:
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Compile GIFs into memory-mappable playback files')
+    parser.add_argument('roots', nargs='+', type=Path, help='directories to compile recursively')
+    parser.add_argument('-r', '--resolution', help='WIDTHxHEIGHT, default: taken from the directory name')
+    parser.add_argument('-m', '--mode', choices=RESIZE_MODES, default=Options.resize_mode,
+                        help="how off-size GIFs are adapted, default: the player's resize_mode")
+    parser.add_argument('-f', '--force', action='store_true', help='recompile up to date files')
+    args = parser.parse_args()
+
+    for root in args.roots:
+        if args.resolution:
+            width, height = (int(v) for v in args.resolution.lower().split('x'))
+            resolution = (width, height)
+        else:
+            resolution = _resolution_from(root)
+        count = compile_tree(root, resolution, args.mode, args.force)
+        logger.info('Compiled %d files in %s at %dx%d (%s)', count, root, *resolution, args.mode)
+
+
+if __name__ == '__main__':
+    main()
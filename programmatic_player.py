@@ -16,12 +16,12 @@ import argparse
 import importlib
 import logging
 import sys
-import time
 from signal import signal, SIGINT
 from pathlib import Path
 
 import display as d
-from config import settings
+from config import Main_Options as Options, settings
+from frame_clock import FrameClock
 
 # Enable logging
 logging.basicConfig(
@@ -62,7 +62,7 @@ def discover_programs():
 
 def init_display(x_boxes, y_boxes, rotate_90):
     """
-    Initialize the display (NeoPixel or PyGame).
+    Initialize the display (NeoPixel, headless or PyGame).
 
     Args:
         x_boxes: Number of boxes horizontally
@@ -70,7 +70,7 @@ def init_display(x_boxes, y_boxes, rotate_90):
         rotate_90: Whether to rotate display 90 degrees
 
     Returns:
-        Display object (NeoPixelDisplay or PyGameDisplay)
+        Display object (NeoPixelDisplay, NullDisplay or PyGameDisplay)
     """
     led_count = x_boxes * y_boxes * 20
 
@@ -95,6 +95,10 @@ def init_display(x_boxes, y_boxes, rotate_90):
             layout=layout_matrix,
             rotate_90=rotate_90
         )
+        display = d.ThreadedDisplay(display, (x_res, y_res))
+    elif settings.headless:
+        logger.info("Initializing headless display")
+        display = d.NullDisplay(x_res, y_res)
     else:
         logger.info("Initializing PyGame display (dev mode)")
         display = d.PyGameDisplay(x_res, y_res, 50)
@@ -139,7 +143,7 @@ def run_programs(display, program_names, start_index=0):
 
                 # Get FPS from program or use default
                 fps = getattr(program_module, 'get_fps', lambda: 30)()
-                frame_delay = 1.0 / fps
+                clock = FrameClock(fps, policy=Options.frame_policy)
                 logger.info(f"Running at {fps} FPS")
 
                 frame_num = 0
@@ -164,10 +168,12 @@ def run_programs(display, program_names, start_index=0):
                 switch_program = True
                 logger.info("Switching to previous program...")
 
-            # Sleep to maintain FPS
-            if not switch_program:  # Don't sleep if we're switching
-                time.sleep(frame_delay)
+            # Wait for the next frame deadline to maintain FPS
+            if not switch_program:  # Don't wait if we're switching
+                clock.wait()
                 frame_num += 1
+            else:
+                logger.info(f"Achieved {clock.achieved_fps:.1f} FPS (drift {clock.drift * 1000:.1f} ms)")
 
     except KeyboardInterrupt:
         logger.info("Interrupted by user")
@@ -0,0 +1,12 @@
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def write_gif():
+    """Factory writing an animated GIF of single-colour frames; returns its path as str."""
+    def write(path, colors, duration=50, size=(5, 4)):
+        frames = [Image.new('RGB', size, color) for color in colors]
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=duration, loop=0)
+        return str(path)
+    return write
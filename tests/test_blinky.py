@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import blinky
+import config
+import display
+import text_queue
+import thequeue
+
+
+@pytest.fixture
+def player(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Constants, 'saved_config', tmp_path / 'dumped_config')
+    for module in (thequeue, text_queue):
+        monkeypatch.setattr(module, 'queue_db', str(tmp_path / f'{module.__name__}.db'))
+        monkeypatch.setattr(module, 'legacy_txt', str(tmp_path / f'{module.__name__}.txt'))
+        module._queue.cache_clear()
+    player = blinky.GifPlayer(display.NullDisplay(5, 4), (5, 4))
+    yield player
+    if player._scheduler.running:
+        player.stop()
+    for module in (thequeue, text_queue):
+        module._queue.cache_clear()
+
+
+@pytest.fixture
+def loads(monkeypatch, player):
+    """Paths player._load was called with; loading waits until release is set."""
+    loads = SimpleNamespace(paths=[], release=threading.Event())
+
+    def load(path):
+        loads.paths.append(path)
+        loads.release.wait(5)
+        return f'animation of {path}'
+
+    monkeypatch.setattr(player, '_load', load)
+    yield loads
+    loads.release.set()
+
+
+class TestPrefetch:
+    def test_prefetched_path_is_served_from_the_future(self, player, loads):
+        loads.release.set()
+        player.prefetch('a.gif')
+        player.prefetch('a.gif')
+        assert player._take_prefetched('a.gif') == 'animation of a.gif'
+        assert loads.paths == ['a.gif']
+        assert player._take_prefetched('a.gif') is None
+
+    def test_oldest_is_cancelled_beyond_two(self, player, loads):
+        player.prefetch('a.gif')  # the worker is busy with this one until release
+        player.prefetch('b.gif')
+        waiting = player._prefetched['b.gif']
+        player.prefetch('c.gif')
+        player.prefetch('d.gif')
+        assert waiting.cancelled()
+        assert list(player._prefetched) == ['c.gif', 'd.gif']
+        loads.release.set()
+        assert player._take_prefetched('d.gif') == 'animation of d.gif'
+        assert 'b.gif' not in loads.paths
+
+    def test_stop_cancels_pending_work(self, player, loads):
+        player.prefetch('a.gif')
+        player.prefetch('b.gif')
+        waiting = player._prefetched['b.gif']
+        player.stop()
+        assert waiting.cancelled()
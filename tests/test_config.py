@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+import config
+
+
+@pytest.fixture
+def saved(monkeypatch, tmp_path):
+    path = tmp_path / 'dumped_config'
+    monkeypatch.setattr(config.Constants, 'saved_config', path)
+    return path
+
+
+class TestOptionsPersistence:
+    def test_changes_apply_at_once_and_are_written_together(self, saved, monkeypatch):
+        monkeypatch.setattr(config, 'SAVE_DELAY', 60)
+        options = config.Options()
+        writes = []
+        monkeypatch.setattr(config.os, 'replace', lambda *args: writes.append(args) or os.rename(*args))
+        for brightness in (0.1, 0.2, 0.3):
+            options.brightness = brightness
+        assert options.brightness == 0.3 and not saved.exists()
+        options.flush()
+        options.flush()
+        assert len(writes) == 1
+        assert json.loads(saved.read_text())['brightness'] == 0.3
+        assert config.Options().brightness == 0.3
+
+    def test_written_after_the_delay(self, saved, monkeypatch):
+        monkeypatch.setattr(config, 'SAVE_DELAY', 0.2)
+        options = config.Options()
+        options.mood = 'chill'
+        timer = options._save_timer
+        timer.join(5)
+        assert json.loads(saved.read_text())['mood'] == 'chill'
+        assert [p.name for p in saved.parent.iterdir()] == ['dumped_config']
+
+    def test_private_state_is_not_saved(self, saved):
+        options = config.Options()
+        options.add_id(42, 'Ada')
+        options.flush()
+        data = json.loads(saved.read_text())
+        assert 42 in data['allowed_ids'] and not any(key.startswith('_') for key in data)
+
+    def test_removed_settings_are_dropped(self, saved):
+        saved.write_text(json.dumps({'text_speed': 3, 'mood': 'chill'}))
+        options = config.Options()
+        assert options.mood == 'chill' and not hasattr(options, 'text_speed')
+        options.brightness = 0.5
+        options.flush()
+        assert 'text_speed' not in json.loads(saved.read_text())
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import config
+import control
+import notify
+import text_queue
+import thequeue
+from config import Main_Options as Options
+
+
+@pytest.fixture(autouse=True)
+def player_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Constants, 'saved_config', tmp_path / 'dumped_config')
+    monkeypatch.setattr(config.Constants, 'control_socket', tmp_path / 'control.sock')
+    for key in ('brightness', 'mood', 'program', 'playlistmode'):
+        monkeypatch.setitem(Options.__dict__, key, getattr(Options, key))
+    for module in (thequeue, text_queue):
+        monkeypatch.setattr(module, 'queue_db', str(tmp_path / f'{module.__name__}.db'))
+        monkeypatch.setattr(module, 'legacy_txt', str(tmp_path / f'{module.__name__}.txt'))
+        module._queue.cache_clear()
+    monkeypatch.setattr(notify, '_events', {topic: notify.threading.Event() for topic in notify.TOPICS})
+    monkeypatch.setattr(notify, '_listener_pid', notify.os.getpid())
+    yield
+    Options.flush()
+    for module in (thequeue, text_queue):
+        module._queue.cache_clear()
+
+
+def _server(user_content: bool = False) -> control.ControlServer:
+    return control.ControlServer(lambda: {'playing': 'x.gif', 'user_content': user_content},
+                                 lambda: ['plasma', 'clock'], lambda: ['default', 'chill'])
+
+
+class TestHandle:
+    def test_brightness(self):
+        assert _server().handle('brightness', 0.25) == {'ok': True}
+        assert Options.brightness == 0.25
+        assert not _server().handle('brightness', 3)['ok']
+        assert not _server().handle('brightness', 'bright')['ok']
+
+    def test_mood_switch_skips_the_background(self):
+        assert _server().handle('mood', 'chill')['ok']
+        assert (Options.mood, Options.playlistmode) == ('chill', 'mood')
+        assert notify.consume('skip')
+
+    def test_switch_does_not_cut_a_queued_gif_short(self):
+        assert _server(user_content=True).handle('program', 'plasma')['ok']
+        assert (Options.program, Options.playlistmode) == ('plasma', 'programmatic')
+        assert not notify.consume('skip')
+
+    def test_unknown_program_mood_and_command(self):
+        assert not _server().handle('program', 'nope')['ok']
+        reply = _server().handle('mood', 'grumpy')
+        assert not reply['ok'] and 'chill' in reply['error']
+        assert Options.mood != 'grumpy'
+        assert not _server().handle('dance')['ok']
+
+    def test_status(self, tmp_path):
+        Image.new('RGB', (5, 4)).save(tmp_path / 'a.gif')
+        thequeue.mark_ready(str(tmp_path / 'a.gif'))
+        status = _server().handle('status')
+        assert status['ok'] and status['playing'] == 'x.gif'
+        assert (status['queued_gifs'], status['queued_text']) == (1, 0)
+
+
+class TestSocket:
+    def test_sync_and_async_clients(self):
+        server = _server()
+        server.start()
+        try:
+            assert control.request('skip') == {'ok': True}
+            assert notify.consume('skip')
+            assert asyncio.run(control.request_async('brightness', 0.5)) == {'ok': True}
+            assert Options.brightness == 0.5
+            assert not control.request('volume', 11)['ok']
+        finally:
+            server.close()
+
+    def test_player_not_running(self):
+        with pytest.raises(OSError):
+            control.request('status')
+
+
+class TestSwitchFromPrograms:
+    @pytest.mark.parametrize('cmd, value', [('mood', 'chill'), ('program', 'clock')])
+    def test_switch_ends_the_program_cycle(self, monkeypatch, cmd, value):
+        import blinky
+        import display
+
+        monkeypatch.setattr(blinky, '_discover_programs', lambda: ['programs.plasma', 'programs.clock'])
+        Options.playlistmode, Options.program = 'programmatic', ''
+        player = blinky.GifPlayer(display.NullDisplay(25, 12), (25, 12))
+        server = control.ControlServer(player.status, lambda: ['plasma', 'clock'], lambda: ['default', 'chill'])
+        thread = threading.Thread(target=player.play_programmatic, args=(threading.Event(),), daemon=True)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while player.status()['playing'] is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert player.status()['playing'] == 'programs.plasma'
+            assert server.handle(cmd, value)['ok']
+            thread.join(5)
+            assert not thread.is_alive() and player.status()['playing'] is None
+        finally:
+            player.stop()
@@ -0,0 +1,295 @@
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import display as d
+from layout import full_layout
+
+
+# ---------------------------------------------------------------------------
+# NullDisplay / RecordingDisplay
+# ---------------------------------------------------------------------------
+
+class TestNullDisplay:
+    def test_counts_frames(self):
+        display = d.NullDisplay(5, 4)
+        for _ in range(3):
+            display.show()
+        assert display.frame_count == 3
+        assert len(display.frame_times) == 2
+
+    def test_max_frames_stops_running(self):
+        display = d.NullDisplay(5, 4, max_frames=2)
+        display.show()
+        assert display.is_running()
+        display.show()
+        assert not display.is_running()
+
+    def test_set_xy_and_set_frame(self):
+        display = d.NullDisplay(5, 4)
+        frame = np.full((4, 5, 3), 7, dtype=np.uint8)
+        display.set_frame(frame)
+        display.set_xy(1, 2, (300, 10, -5))
+        assert display.frame[0, 0].tolist() == [7, 7, 7]
+        assert display.frame[2, 1].tolist() == [255, 10, 0]
+
+
+class TestRecordingDisplay:
+    def _show(self, display, value):
+        display.set_frame(np.full((4, 5, 3), value, dtype=np.uint8))
+        display.show()
+
+    def test_records_in_order(self):
+        display = d.RecordingDisplay(5, 4, capacity=4)
+        for value in range(3):
+            self._show(display, value)
+        assert display.recorded()[:, 0, 0, 0].tolist() == [0, 1, 2]
+
+    def test_ring_buffer_wraps(self):
+        display = d.RecordingDisplay(5, 4, capacity=3)
+        for value in range(5):
+            self._show(display, value)
+        assert display.recorded()[:, 0, 0, 0].tolist() == [2, 3, 4]
+
+    def test_memmap_file(self, tmp_path):
+        path = tmp_path / 'frames.npy'
+        display = d.RecordingDisplay(5, 4, capacity=2, path=str(path))
+        self._show(display, 9)
+        display.frames.flush()
+        assert np.load(path)[0, 0, 0, 0] == 9
+
+
+# ---------------------------------------------------------------------------
+# NeoPixelDisplay (off the Pi the strip is a plain list)
+# ---------------------------------------------------------------------------
+
+@pytest.mark.skipif(d.IS_ARM, reason='drives the real strip on ARM')
+class TestNeoPixelDisplay:
+    @pytest.fixture
+    def display(self, monkeypatch):
+        # Patch the instance dict directly: Options persists on every setattr
+        monkeypatch.setitem(d.Options.__dict__, 'brightness', 1)
+        monkeypatch.setitem(d.Options.__dict__, 'led_type', 'rgb')
+        monkeypatch.setitem(d.Options.__dict__, 'gamma', 1.0)
+        return d.NeoPixelDisplay(40, 2, 1, False)
+
+    def test_set_frame_matches_set_xy(self, display):
+        frame = np.random.default_rng(0).integers(0, 256, (4, 10, 3), dtype=np.uint8)
+        display.set_frame(frame)
+        bulk = display._pixels.copy()
+        for y in range(4):
+            for x in range(10):
+                display.set_xy(x, y, frame[y, x].tolist())
+        np.testing.assert_array_equal(bulk, display._pixels)
+
+    def test_set_frame_follows_layout(self, display):
+        frame = np.zeros((4, 10, 3), dtype=np.uint8)
+        frame[1, 7] = (10, 20, 30)
+        display.set_frame(frame)
+        assert display._pixels[full_layout(2, 1)[1, 7]].tolist() == [10, 20, 30]
+
+    def test_dark_pixels_switched_off(self, display):
+        frame = np.full((4, 10, 3), 3, dtype=np.uint8)
+        display.set_frame(frame)
+        assert not display._pixels.any()
+
+    def test_unchanged_frame_is_skipped(self, display):
+        display.set_frame(np.full((4, 10, 3), 50, dtype=np.uint8))
+        display.show()
+        display.show()
+        assert (display.frames_pushed, display.frames_skipped) == (1, 1)
+
+
+class FakeNeoPixel:
+    """adafruit_pixelbuf's buffer layout: a header, then each LED in GRB byte order."""
+
+    def __init__(self, pin, n, brightness, auto_write):
+        self._offset = 1
+        self._byteorder = (1, 0, 2)
+        self._post_brightness_buffer = bytearray(b'H' + bytes(3 * n))
+        self.sent: list[bytes] = []
+
+    def __setitem__(self, index, value):
+        raise AssertionError('frames must not go through the per-LED setter')
+
+    def show(self):
+        self.sent.append(bytes(self._post_brightness_buffer))
+
+
+class TestNeoPixelStripBuffer:
+    def test_frame_written_into_the_strip_bytes(self, monkeypatch):
+        monkeypatch.setattr(d, 'IS_ARM', True)
+        monkeypatch.setitem(sys.modules, 'board', SimpleNamespace(D18=18))
+        monkeypatch.setitem(sys.modules, 'neopixel', SimpleNamespace(NeoPixel=FakeNeoPixel))
+        monkeypatch.setitem(d.Options.__dict__, 'brightness', 1)
+        monkeypatch.setitem(d.Options.__dict__, 'led_type', 'rgb')
+        monkeypatch.setitem(d.Options.__dict__, 'gamma', 1.0)
+        display = d.NeoPixelDisplay(40, 2, 1, False)
+        frame = np.zeros((4, 10, 3), dtype=np.uint8)
+        frame[1, 7] = (10, 20, 30)
+        display.set_frame(frame)
+        display.show()
+        led = full_layout(2, 1)[1, 7]
+        expected = bytearray(b'H' + bytes(120))
+        expected[1 + 3 * led:4 + 3 * led] = bytes([20, 10, 30])
+        assert display.strip.sent == [bytes(expected)]
+
+
+@pytest.mark.skipif(d.IS_ARM, reason='drives the real strip on ARM')
+class TestNeoPixelOutput:
+    """Exact bytes on the strip for brightness, gamma and channel order."""
+
+    @pytest.fixture
+    def pushed(self, monkeypatch):
+        def push(color, brightness=1, gamma=1.0, led_type='rgb'):
+            monkeypatch.setitem(d.Options.__dict__, 'brightness', brightness)
+            monkeypatch.setitem(d.Options.__dict__, 'gamma', gamma)
+            monkeypatch.setitem(d.Options.__dict__, 'led_type', led_type)
+            display = d.NeoPixelDisplay(40, 2, 1, False)
+            frame = np.zeros((4, 10, 3), dtype=np.uint8)
+            frame[1, 7] = color
+            display.set_frame(frame)
+            display.show()
+            return display, display.strip[full_layout(2, 1)[1, 7]]
+        return push
+
+    def test_brightness_scales_and_truncates(self, pushed):
+        assert pushed((200, 101, 4), brightness=0.5)[1] == [100, 50, 2]
+
+    def test_gamma(self, pushed):
+        assert pushed((255, 128, 64), gamma=2.2)[1] == [255, 55, 12]
+
+    def test_grb_swaps_red_and_green(self, pushed):
+        assert pushed((10, 20, 30), led_type='grb')[1] == [20, 10, 30]
+
+    def test_all_together(self, pushed):
+        assert pushed((255, 128, 64), brightness=0.25, gamma=2.0, led_type='grb')[1] == [16, 63, 4]
+
+    def test_dark_stays_off_at_any_setting(self, pushed):
+        assert pushed((3, 3, 3), brightness=0.5, gamma=2.2, led_type='grb')[1] == [0, 0, 0]
+
+    def test_tables_follow_option_changes(self, pushed, monkeypatch):
+        display, _ = pushed((200, 100, 50))
+        monkeypatch.setitem(d.Options.__dict__, 'brightness', 0.5)
+        monkeypatch.setitem(d.Options.__dict__, 'led_type', 'grb')
+        display.set_brightness()
+        frame = np.zeros((4, 10, 3), dtype=np.uint8)
+        frame[1, 7] = (200, 100, 50)
+        display.set_frame(frame)
+        display.show()
+        assert display.strip[full_layout(2, 1)[1, 7]] == [50, 100, 25]
+
+
+# ---------------------------------------------------------------------------
+# PyGameDisplay (headless through SDL's dummy video driver)
+# ---------------------------------------------------------------------------
+
+class TestPyGameDisplay:
+    SIZE = 10  # window pixels per LED
+
+    @pytest.fixture
+    def window(self, monkeypatch):
+        pytest.importorskip('pygame')
+        monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+        monkeypatch.setitem(d.Options.__dict__, 'brightness', 1)
+        displays = []
+
+        def open_window(**kwargs):
+            display = d.PyGameDisplay(5, 4, self.SIZE, **kwargs)
+            displays.append(display)
+            return display
+        yield open_window
+        if displays:
+            displays[0].pg.quit()
+
+    @staticmethod
+    def _frame():
+        # Non-square and asymmetric, so a transposed or flipped frame shows
+        frame = np.zeros((4, 5, 3), dtype=np.uint8)
+        frame[1, 3] = (200, 100, 50)
+        frame[3, 0] = (10, 20, 30)
+        return frame
+
+    def _screen_at(self, display, x, y, dx=None, dy=None):
+        """Colour of the window pixel at offset dx, dy (default: centre) in the cell of LED x, y."""
+        half = self.SIZE // 2
+        at = (x * self.SIZE + (half if dx is None else dx), y * self.SIZE + (half if dy is None else dy))
+        return tuple(display.pg.display.get_surface().get_at(at))[:3]
+
+    def test_set_frame_lands_on_the_led_pixels(self, window):
+        display = window()
+        display.set_frame(self._frame())
+        assert tuple(display.surface.get_at((3, 1)))[:3] == (200, 100, 50)
+        assert tuple(display.surface.get_at((0, 3)))[:3] == (10, 20, 30)
+        assert tuple(display.surface.get_at((1, 3)))[:3] == (0, 0, 0)
+        display.show()
+        assert self._screen_at(display, 3, 1) == (200, 100, 50)
+        assert self._screen_at(display, 0, 3) == (10, 20, 30)
+        assert self._screen_at(display, 1, 3) == (0, 0, 0)
+
+    def test_set_frame_matches_set_xy(self, window):
+        display = window()
+        frame = np.random.default_rng(0).integers(0, 256, (4, 5, 3), dtype=np.uint8)
+        display.set_frame(frame)
+        bulk = display.pg.surfarray.array3d(display.surface).copy()
+        display.surface.fill((0, 0, 0))
+        for y in range(4):
+            for x in range(5):
+                display.set_xy(x, y, frame[y, x].tolist())
+        np.testing.assert_array_equal(bulk, display.pg.surfarray.array3d(display.surface))
+        np.testing.assert_array_equal(bulk.swapaxes(0, 1), frame)
+
+    def test_brightness(self, window, monkeypatch):
+        display = window()
+        monkeypatch.setitem(d.Options.__dict__, 'brightness', 0.5)
+        display.set_brightness()
+        display.set_frame(self._frame())
+        assert tuple(display.surface.get_at((3, 1)))[:3] == (100, 50, 25)
+
+    def test_grid_overlay(self, window):
+        display = window(grid=True)
+        display.set_frame(self._frame())
+        display.show()
+        assert self._screen_at(display, 3, 1) == (200, 100, 50)
+        assert self._screen_at(display, 3, 1, dx=0) == (40, 40, 40)
+        assert self._screen_at(display, 3, 1, dy=self.SIZE - 1) == (40, 40, 40)
+
+    def test_led_look_overlay(self, window):
+        display = window(led_look=True)
+        display.set_frame(self._frame())
+        display.show()
+        assert self._screen_at(display, 3, 1) == (200, 100, 50)
+        assert self._screen_at(display, 3, 1, dx=0, dy=0) == (0, 0, 0)
+
+
+# ---------------------------------------------------------------------------
+# ThreadedDisplay
+# ---------------------------------------------------------------------------
+
+class TestThreadedDisplay:
+    def test_frames_reach_wrapped_display(self):
+        inner = d.NullDisplay(5, 4)
+        display = d.ThreadedDisplay(inner, (5, 4), fps=1000)
+        try:
+            display.set_frame(np.full((4, 5, 3), 42, dtype=np.uint8))
+            display.show()
+            deadline = time.monotonic() + 2
+            while inner.frame_count == 0 and time.monotonic() < deadline:
+                time.sleep(0.001)
+        finally:
+            display.close()
+        assert inner.frame[0, 0].tolist() == [42, 42, 42]
+        assert display.frames_pushed == 1
+
+    def test_back_buffer_keeps_last_frame(self):
+        display = d.ThreadedDisplay(d.NullDisplay(5, 4), (5, 4))
+        try:
+            display.set_xy(2, 1, (1, 2, 3))
+            display.show()
+            display.set_xy(0, 0, (9, 9, 9))
+            assert display._back[1, 2].tolist() == [1, 2, 3]
+        finally:
+            display.close()
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+
+import pytest
+
+from durable_queue import DurableQueue, QueueFull
+
+
+class TestDurableQueue:
+    def test_fifo(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        assert not queue.has_items()
+        for item in ('a', 'b', 'c'):
+            queue.put(item)
+        assert len(queue) == 3
+        assert [queue.take(), queue.take()] == ['a', 'b']
+        queue.put('d')
+        assert [queue.take(), queue.take(), queue.take()] == ['c', 'd', None]
+
+    def test_survives_reopening(self, tmp_path):
+        DurableQueue(tmp_path / 'q.db').put('a')
+        queue = DurableQueue(tmp_path / 'q.db')
+        assert queue.take() == 'a'
+        assert DurableQueue(tmp_path / 'q.db').take() is None
+
+    def test_migrates_legacy_file_once(self, tmp_path):
+        legacy = tmp_path / 'queue.txt'
+        legacy.write_text('one\n\ntwo\n')
+        queue = DurableQueue(tmp_path / 'q.db', legacy=legacy)
+        assert not legacy.exists()
+        # A file left behind by a crash after the import is not imported again
+        legacy.write_text('one\ntwo\n')
+        DurableQueue(tmp_path / 'q.db', legacy=legacy)
+        assert [queue.take(), queue.take(), queue.take()] == ['one', 'two', None]
+
+    def test_concurrent_takers_get_each_item_once(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        for i in range(200):
+            queue.put(str(i))
+        taken: list[str] = []
+
+        def drain():
+            while (item := queue.take()) is not None:
+                taken.append(item)
+
+        threads = [threading.Thread(target=drain) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(taken, key=int) == [str(i) for i in range(200)]
+
+
+class TestFairness:
+    def test_round_robin_between_senders(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        for i in range(3):
+            queue.put(f'a{i}', 'alice')
+        queue.put('b0', 'bob')
+        queue.put('b1', 'bob')
+        assert [queue.take() for _ in range(5)] == ['a0', 'b0', 'a1', 'b1', 'a2']
+
+    def test_new_sender_joins_after_the_current_round(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        for i in range(3):
+            queue.put(f'a{i}', 'alice')
+        assert queue.take() == 'a0'
+        assert queue.take() == 'a1'
+        queue.put('b0', 'bob')
+        assert [queue.take(), queue.take()] == ['a2', 'b0']
+
+    def test_limits(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        queue.put('a0', 'alice', max_per_sender=2)
+        queue.put('a1', 'alice', max_per_sender=2)
+        with pytest.raises(QueueFull):
+            queue.put('a2', 'alice', max_per_sender=2)
+        with pytest.raises(QueueFull):
+            queue.put('b0', 'bob', max_total=2)
+        queue.take()
+        queue.put('a2', 'alice', max_per_sender=2)
+
+    def test_coalesces_repeats_of_a_sender(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        queue.put('hi', 'alice', cost=4, coalesce=True)
+        queue.put('hi', 'bob', cost=4, coalesce=True)
+        assert queue.put('hi', 'alice', cost=4, coalesce=True) == 0
+        assert len(queue) == 2
+
+    def test_eta_adds_up_the_cost_ahead(self, tmp_path):
+        queue = DurableQueue(tmp_path / 'q.db')
+        assert queue.put('a0', 'alice', cost=10) == 0
+        assert queue.put('a1', 'alice', cost=10) == 10
+        # bob's first item overtakes alice's second
+        assert queue.put('b0', 'bob', cost=3) == 10
+        queue.take()  # a0 is now playing for 10 s
+        assert queue.put('c0', 'carol', cost=1) == pytest.approx(10 + 3 + 10, abs=0.5)
+
+    def test_upgrades_a_queue_without_senders(self, tmp_path):
+        path = tmp_path / 'q.db'
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)')
+        db.execute("INSERT INTO items (payload) VALUES ('old')")
+        db.commit()
+        db.close()
+        queue = DurableQueue(path)
+        queue.put('new', 'alice')
+        assert [queue.take(), queue.take()] == ['old', 'new']
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from frame_cache import DEFAULT_GIF_DURATION_MS, FrameCache, decode
+
+
+# ---------------------------------------------------------------------------
+# decode
+# ---------------------------------------------------------------------------
+
+class TestDecode:
+    def test_frames_and_durations(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 0, 255)], duration=40)
+        animation = decode(path, (5, 4))
+        assert animation.frames.shape == (2, 4, 5, 3)
+        assert animation.frames[1, 0, 0].tolist() == [0, 0, 255]
+        assert animation.durations.tolist() == [40, 40]
+        assert not animation.still
+
+    def test_crops_to_resolution(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], size=(8, 6))
+        assert decode(path, (5, 4)).frames.shape == (2, 4, 5, 3)
+
+    def test_tiny_durations_use_default(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], duration=0)
+        assert decode(path, (5, 4)).durations.tolist() == [DEFAULT_GIF_DURATION_MS] * 2
+
+    def test_still_image(self, tmp_path):
+        path = tmp_path / 'photo.png'
+        Image.new('RGB', (5, 4), (1, 2, 3)).save(path)
+        animation = decode(str(path), (5, 4))
+        assert animation.still
+        assert len(animation.frames) == 1
+
+
+# ---------------------------------------------------------------------------
+# FrameCache
+# ---------------------------------------------------------------------------
+
+class TestFrameCache:
+    def test_hit_returns_same_frames(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        cache = FrameCache(1 << 20)
+        first = cache.get(path, (5, 4))
+        assert cache.get(path, (5, 4)) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_modified_file_is_decoded_again(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        cache = FrameCache(1 << 20)
+        cache.get(path, (5, 4))
+        write_gif(path, [(0, 0, 255), (0, 255, 0)])
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+        assert cache.get(path, (5, 4)).frames[0, 0, 0].tolist() == [0, 0, 255]
+        assert len(cache) == 1
+
+    def test_evicts_least_recently_used(self, tmp_path, write_gif):
+        paths = [write_gif(tmp_path / f'{i}.gif', [(i + 1, 0, 0), (0, i + 1, 0)]) for i in range(3)]
+        one = decode(paths[0], (5, 4)).nbytes
+        cache = FrameCache(2 * one)
+        cache.get(paths[0], (5, 4))
+        cache.get(paths[1], (5, 4))
+        cache.get(paths[0], (5, 4))
+        cache.get(paths[2], (5, 4))
+        assert cache.size <= 2 * one
+        cache.get(paths[0], (5, 4))
+        assert cache.hits == 2
+
+    def test_oversized_entry_not_cached(self, tmp_path, write_gif):
+        path = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        cache = FrameCache(10)
+        animation = cache.get(path, (5, 4))
+        assert len(cache) == 0
+        np.testing.assert_array_equal(animation.frames, decode(path, (5, 4)).frames)
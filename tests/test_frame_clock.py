@@ -0,0 +1,88 @@
+import pytest
+
+import frame_clock
+from frame_clock import FrameClock
+
+
+class FakeTime:
+    """Stands in for time.monotonic/time.sleep so pacing can be checked deterministically."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(frame_clock.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(frame_clock.time, 'sleep', fake.sleep)
+    return fake
+
+
+# ---------------------------------------------------------------------------
+# Pacing
+# ---------------------------------------------------------------------------
+
+class TestPacing:
+    def test_render_time_is_absorbed(self, fake_time):
+        clock = FrameClock(fps=10)
+        clock.wait()
+        fake_time.now += 0.03  # rendering took 30 ms
+        clock.wait()
+        assert fake_time.slept[-1] == pytest.approx(0.07)
+
+    def test_explicit_duration(self, fake_time):
+        clock = FrameClock(fps=10)
+        clock.wait(0.04)
+        assert fake_time.slept[-1] == pytest.approx(0.04)
+
+    def test_achieved_fps(self, fake_time):
+        clock = FrameClock(fps=20)
+        for _ in range(5):
+            clock.wait()
+        assert clock.achieved_fps == pytest.approx(20)
+
+
+# ---------------------------------------------------------------------------
+# Late frames
+# ---------------------------------------------------------------------------
+
+class TestPolicies:
+    def test_drop_restarts_schedule(self, fake_time):
+        clock = FrameClock(fps=10, policy='drop')
+        clock.wait()
+        fake_time.now += 0.25
+        clock.wait()
+        assert clock.frames_late == 1
+        assert clock.drift == pytest.approx(0.15)
+        fake_time.slept.clear()
+        clock.wait()
+        assert fake_time.slept == [pytest.approx(0.1)]
+
+    def test_catch_up_keeps_schedule(self, fake_time):
+        clock = FrameClock(fps=10, policy='catch_up')
+        clock.wait()
+        fake_time.now += 0.25
+        clock.wait()
+        fake_time.slept.clear()
+        clock.wait()  # still behind, runs immediately
+        clock.wait()  # back on schedule
+        assert clock.frames_late == 2
+        assert fake_time.slept == [pytest.approx(0.05)]
+
+    def test_catch_up_gives_up_beyond_max_lag(self, fake_time):
+        clock = FrameClock(fps=10, policy='catch_up', max_lag=0.5)
+        clock.wait()
+        fake_time.now += 2
+        clock.wait()
+        fake_time.slept.clear()
+        clock.wait()
+        assert fake_time.slept == [pytest.approx(0.1)]
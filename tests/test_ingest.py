@@ -0,0 +1,147 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import ingest
+import playback
+import thequeue
+from durable_queue import QueueFull
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """Conversions that wait for release and then just copy the source. Counts the calls."""
+    release = threading.Event()
+    calls = []
+
+    def transcode(data, out, resolution):
+        calls.append(data)
+        release.wait(5)
+        with open(out, 'wb') as f:
+            f.write(data)
+        return out
+
+    monkeypatch.setattr(ingest, 'transcode', transcode)
+    release.calls = calls
+    return release
+
+
+def make_ingestor(tmp_path, budget=1 << 20, **kwargs):
+    cache = ingest.MediaCache(tmp_path / 'cache', budget)
+    return ingest.Ingestor(tmp_path / 'gifs', (25, 12), cache, executor=ThreadPoolExecutor(1), **kwargs)
+
+
+def image(*frames, **params):
+    data = io.BytesIO()
+    frames[0].save(data, save_all=len(frames) > 1, append_images=frames[1:], **params)
+    return data.getvalue()
+
+
+class TestIngestor:
+    def test_converts_in_the_background(self, tmp_path, blocked):
+        ingestor = make_ingestor(tmp_path)
+        future = ingestor.submit(b'video')
+        assert not future.done() and ingestor.jobs == 1
+        blocked.set()
+        out = future.result(5)
+        assert out.startswith(str(tmp_path / 'gifs')) and out.endswith(playback.SUFFIX)
+        assert open(out, 'rb').read() == b'video'
+        assert ingestor.jobs == 0
+
+    def test_refuses_beyond_max_jobs(self, tmp_path, blocked):
+        ingestor = make_ingestor(tmp_path, max_jobs=2)
+        for i in range(2):
+            ingestor.submit(bytes([i]))
+        with pytest.raises(QueueFull):
+            ingestor.submit(b'\x02')
+        blocked.set()
+        ingestor.close()
+
+    def test_same_bytes_again_reuse_the_conversion(self, tmp_path, blocked):
+        blocked.set()
+        ingestor = make_ingestor(tmp_path)
+        first = ingestor.submit(b'meme').result(5)
+        again = ingestor.submit(b'meme')
+        assert again.done() and len(blocked.calls) == 1
+        assert again.result() != first and open(again.result(), 'rb').read() == b'meme'
+        # The player moves played files away; the cached conversion stays
+        os.remove(first)
+        assert open(ingestor.submit(b'meme').result(), 'rb').read() == b'meme'
+
+    def test_evicted_after_lookup_converts_again(self, tmp_path, blocked, monkeypatch):
+        blocked.set()
+        ingestor = make_ingestor(tmp_path)
+        ingestor.submit(b'meme').result(5)
+        lookup = ingestor.cache.lookup
+
+        def lookup_then_trimmed(key):
+            cached = lookup(key)
+            os.remove(cached)
+            return cached
+
+        monkeypatch.setattr(ingestor.cache, 'lookup', lookup_then_trimmed)
+        again = ingestor.submit(b'meme')
+        assert open(again.result(5), 'rb').read() == b'meme'
+        assert len(blocked.calls) == 2
+
+    def test_same_bytes_while_converting_wait_for_it(self, tmp_path, blocked):
+        ingestor = make_ingestor(tmp_path)
+        first = ingestor.submit(b'meme')
+        second = ingestor.submit(b'meme')
+        assert ingestor.jobs == 1
+        blocked.set()
+        assert first.result(5) != second.result(5)
+        assert len(blocked.calls) == 1
+
+    def test_other_resolution_converts_again(self, tmp_path, blocked):
+        blocked.set()
+        cache = ingest.MediaCache(tmp_path / 'cache', 1 << 20)
+        for resolution in ((25, 12), (50, 24)):
+            ingestor = ingest.Ingestor(tmp_path / 'gifs', resolution, cache, executor=ThreadPoolExecutor(1))
+            ingestor.submit(b'meme').result(5)
+        assert len(blocked.calls) == 2
+
+
+class TestNative:
+    def test_photo_becomes_a_still_playback_file(self, tmp_path):
+        ingestor = make_ingestor(tmp_path)
+        out = ingestor.submit(image(Image.new('RGB', (800, 600), (200, 10, 10)), format='JPEG')).result(5)
+        assert out.endswith(playback.SUFFIX)
+        animation = playback.load(out)
+        assert animation.still and animation.frames.shape == (1, 12, 25, 3)
+        assert np.abs(animation.frames[0].astype(int) - (200, 10, 10)).max() < 8
+        assert thequeue.play_seconds(out) == thequeue.STILL_SECONDS
+
+    def test_small_gif_keeps_its_frames(self, tmp_path):
+        frames = [Image.new('RGB', (50, 24), color) for color in ('red', 'blue')]
+        out = make_ingestor(tmp_path).submit(image(*frames, format='GIF', duration=200, loop=0)).result(5)
+        animation = playback.load(out)
+        assert not animation.still and animation.durations.tolist() == [200, 200]
+        assert thequeue.play_seconds(out) == 0.5
+
+    def test_video_goes_to_ffmpeg(self):
+        assert not ingest.is_native(b'\0\0\0\x18ftypmp42')
+        assert not ingest.is_native(b'GIF89a' + bytes(ingest.NATIVE_GIF_BYTES))
+
+    @pytest.mark.skipif(not hasattr(os, 'memfd_create'), reason='Linux only')
+    def test_ffmpeg_reads_the_upload_from_memory(self):
+        with ingest._memory_file(b'video') as (path, input_data, pass_fds):
+            assert input_data is None and path == f'/dev/fd/{pass_fds[0]}'
+            with open(path, 'rb') as f:
+                assert f.read() == b'video'
+
+
+class TestMediaCache:
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ingest.MediaCache(tmp_path, budget_bytes=20)
+        for i, key in enumerate('abc'):
+            cache.path(key).write_bytes(b'x' * 10)
+            os.utime(cache.path(key), ns=(i * 10**9, i * 10**9))
+        assert cache.lookup('a')
+        cache.trim()
+        assert cache.lookup('a') and cache.lookup('c') and cache.lookup('b') is None
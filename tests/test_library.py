@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from library import BackgroundLibrary, tokenize
+
+
+@pytest.fixture
+def root(tmp_path):
+    for name in ['chill/chill_stars.gif', 'chill/Green Rain.gif', 'disco/disco_stars.gif',
+                 'default/_Demo 1_Rectangular Madness.gif', 'default/notes.txt']:
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.touch()
+    return tmp_path
+
+
+def test_tokenize():
+    assert tokenize('chill/_Demo 1_Rectangular Madness.gif') == ['chill', 'demo', '1', 'rectangular', 'madness', 'gif']
+
+
+class TestLookups:
+    def test_moods(self, root):
+        assert BackgroundLibrary(root).moods() == ['chill', 'default', 'disco']
+
+    def test_by_mood_only_gifs(self, root):
+        library = BackgroundLibrary(root)
+        assert [os.path.basename(p) for p in library.by_mood('default')] == ['_Demo 1_Rectangular Madness.gif']
+        assert library.by_mood('missing') == []
+
+    def test_search_matches_token_fragments(self, root):
+        library = BackgroundLibrary(root)
+        assert [os.path.basename(p) for p in library.search('star')] == ['chill_stars.gif', 'disco_stars.gif']
+
+    def test_search_requires_every_word(self, root):
+        library = BackgroundLibrary(root)
+        assert [os.path.basename(p) for p in library.search('Stars chill')] == ['chill_stars.gif']
+
+    def test_search_matches_mood_and_separators(self, root):
+        library = BackgroundLibrary(root)
+        assert len(library.search('disco')) == 1
+        assert [os.path.basename(p) for p in library.search('green rain')] == ['Green Rain.gif']
+        assert [os.path.basename(p) for p in library.search('chill_st')] == ['chill_stars.gif']
+
+    def test_empty_pattern_matches_all(self, root):
+        assert len(BackgroundLibrary(root).search('')) == 4
+
+
+class TestRefresh:
+    def test_unchanged(self, root):
+        assert not BackgroundLibrary(root).refresh()
+
+    def test_new_file_and_mood(self, root):
+        library = BackgroundLibrary(root)
+        assert library.search('fire') == []
+        (root / 'chill' / 'fire.gif').touch()
+        os.utime(root / 'chill', ns=(0, os.stat(root / 'chill').st_mtime_ns + 1_000_000))
+        (root / 'party').mkdir()
+        (root / 'party' / 'fire2.gif').touch()
+        os.utime(root, ns=(0, os.stat(root).st_mtime_ns + 1_000_000))
+        assert library.refresh()
+        assert len(library.search('fire')) == 2
+        assert 'party' in library.moods()
+
+    def test_removed_mood(self, root):
+        library = BackgroundLibrary(root)
+        for path in (root / 'disco').iterdir():
+            path.unlink()
+        (root / 'disco').rmdir()
+        os.utime(root, ns=(0, os.stat(root).st_mtime_ns + 1_000_000))
+        assert library.refresh()
+        assert library.moods() == ['chill', 'default']
+        assert len(library.search('stars')) == 1
+
+    def test_mood_removed_while_refreshing(self, root, monkeypatch):
+        library = BackgroundLibrary(root)
+        (root / 'party').mkdir()
+        os.utime(root, ns=(0, os.stat(root).st_mtime_ns + 1_000_000))
+        stat = os.stat
+
+        def stat_racing_removal(path, *args, **kwargs):
+            # party is listed by the scan but gone by the time its mtime is read
+            if str(path) == str(root / 'party'):
+                raise FileNotFoundError(path)
+            return stat(path, *args, **kwargs)
+
+        monkeypatch.setattr('library.os.stat', stat_racing_removal)
+        library.refresh()
+        monkeypatch.undo()
+        (root / 'party').rmdir()
+        os.utime(root, ns=(0, os.stat(root).st_mtime_ns + 2_000_000))
+        assert library.refresh()
+        assert library.moods() == ['chill', 'default', 'disco']
@@ -0,0 +1,52 @@
+import os
+import time
+
+import pytest
+
+import notify
+
+
+@pytest.fixture
+def listener(monkeypatch, tmp_path):
+    monkeypatch.setattr(notify.Constants, 'notify_socket', tmp_path / 'notify.sock')
+    monkeypatch.setattr(notify, '_events', {topic: notify.threading.Event() for topic in notify.TOPICS})
+    monkeypatch.setattr(notify, '_listener_pid', None)
+    notify.listen()
+    return tmp_path / 'notify.sock'
+
+
+def _wait_for(topic: str) -> bool:
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        if notify.changed(topic):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestNotify:
+    def test_always_changed_when_not_listening(self, monkeypatch):
+        monkeypatch.setattr(notify, '_listener_pid', None)
+        assert notify.changed('gifs') and notify.changed('gifs')
+
+    def test_in_process_flag_is_consumed(self, listener):
+        assert not notify.changed('text')
+        notify.notify('text')
+        assert notify.changed('text')
+        assert not notify.changed('text')
+        assert not notify.changed('gifs')
+
+    def test_other_processes_notify_over_the_socket(self, listener):
+        pid = os.fork()
+        if pid == 0:  # the child inherits the flag but is not the listener
+            try:
+                notify.notify('skip')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        assert _wait_for('skip')
+
+    def test_notify_without_player_is_harmless(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(notify.Constants, 'notify_socket', tmp_path / 'missing.sock')
+        monkeypatch.setattr(notify, '_listener_pid', None)
+        notify.notify('gifs')
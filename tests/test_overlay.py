@@ -0,0 +1,55 @@
+import numpy as np
+
+from overlay import TextScroller, composite, dots_to_bitmap
+
+
+class TestDotsToBitmap:
+    def test_marks_dots(self):
+        bitmap = dots_to_bitmap([[0, 1], [6, 3]])
+        assert bitmap.shape == (4, 7)
+        assert bitmap[1, 0] and bitmap[3, 6]
+        assert bitmap.sum() == 2
+
+    def test_empty(self):
+        assert dots_to_bitmap([]).size == 0
+
+
+class TestTextScroller:
+    def test_enters_from_the_right_and_leaves_on_the_left(self):
+        bitmap = np.ones((2, 3), dtype=bool)
+        scroller = TextScroller(bitmap, (5, 4))
+        assert not scroller.step(10, now=0).any()
+        mask = scroller.step(10, now=0.1)  # one pixel in
+        assert mask.shape == (4, 5)
+        assert mask[:2, 4].all() and mask.sum() == 2
+        assert not scroller.step(10, now=0.8).any()  # fully out: 3 + 5 pixels
+        assert scroller.step(10, now=0.9) is None
+
+    def test_speed_follows_time_not_frames(self):
+        bitmap = np.ones((1, 1), dtype=bool)
+        scroller = TextScroller(bitmap, (10, 1))
+        scroller.step(4, now=0)
+        for i in range(1, 100):
+            mask = scroller.step(4, now=i / 100)
+        # 0.99 s at 4 px/s: the dot has moved 3 pixels in from the right edge
+        assert mask[0, 7]
+
+    def test_crops_to_screen_height(self):
+        scroller = TextScroller(np.ones((8, 2), dtype=bool), (3, 4))
+        scroller.step(1, now=0)
+        assert scroller.step(1, now=2).shape == (4, 3)
+
+
+class TestComposite:
+    def test_dims_background_and_paints_text(self):
+        frame = np.full((4, 5, 3), 200, dtype=np.uint8)
+        mask = np.zeros((4, 5), dtype=bool)
+        mask[1, 2] = True
+        out = composite(frame, mask, 0.5, (10, 20, 30))
+        assert out[0, 0].tolist() == [100, 100, 100]
+        assert out[1, 2].tolist() == [10, 20, 30]
+
+    def test_leaves_input_untouched(self):
+        frame = np.full((4, 5, 3), 200, dtype=np.uint8)
+        composite(frame, np.ones((4, 5), dtype=bool), 0.15, (255, 255, 255))
+        assert (frame == 200).all()
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+import playback
+from frame_cache import Animation, decode
+
+
+class TestRoundTrip:
+    def test_load_matches_written(self, tmp_path):
+        frames = np.random.default_rng(1).integers(0, 256, (3, 4, 5, 3), dtype=np.uint8)
+        animation = Animation(frames, np.array([10, 20, 30], dtype=np.int32))
+        path = tmp_path / 'a.frames'
+        playback.write(path, animation)
+        loaded = playback.load(path)
+        np.testing.assert_array_equal(loaded.frames, frames)
+        assert loaded.durations.tolist() == [10, 20, 30]
+        assert not loaded.still
+        assert isinstance(loaded.frames, np.memmap)
+
+    def test_still_flag(self, tmp_path):
+        animation = Animation(np.zeros((1, 4, 5, 3), dtype=np.uint8), np.array([100], dtype=np.int32), still=True)
+        path = tmp_path / 'still.frames'
+        playback.write(path, animation)
+        assert playback.load(path).still
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / 'bogus.frames'
+        path.write_bytes(b'GIF89a' + b'\0' * 64)
+        with pytest.raises(ValueError):
+            playback.load(path)
+
+
+class TestCompile:
+    def test_compile_file_matches_decode(self, tmp_path, write_gif):
+        gif = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        out = playback.compile_file(gif, (5, 4), 'cut')
+        assert out == tmp_path / 'a.frames'
+        np.testing.assert_array_equal(playback.load(out).frames, decode(str(gif), (5, 4)).frames)
+
+    def test_off_size_gif_compiles_with_the_given_mode(self, tmp_path, write_gif):
+        gif = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], size=(10, 4))
+        out = playback.compile_file(gif, (5, 4), 'scale')
+        np.testing.assert_array_equal(playback.load(out).frames, decode(gif, (5, 4), 'scale').frames)
+        assert playback.resize_mode(out) == 'scale'
+        assert playback.find_compiled(gif, 'scale') == out
+        # Played cropped, the file would look different from a decode at play time
+        assert playback.find_compiled(gif, 'cut') is None
+        assert playback.compile_tree(tmp_path, (5, 4), 'cut') == 1
+        assert playback.resize_mode(out) == 'cut'
+
+    def test_mode_not_recorded(self, tmp_path):
+        path = tmp_path / 'a.frames'
+        playback.write(path, Animation(np.zeros((1, 4, 5, 3), dtype=np.uint8), np.array([100], dtype=np.int32)))
+        assert playback.resize_mode(path) is None
+
+    def test_find_compiled_ignores_stale_files(self, tmp_path, write_gif):
+        gif = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        assert playback.find_compiled(gif) is None
+        out = playback.compile_file(gif, (5, 4), 'scale')
+        assert playback.find_compiled(gif) == out
+        stat = os.stat(out)
+        os.utime(gif, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert playback.find_compiled(gif) is None
+
+    def test_compile_tree_skips_up_to_date(self, tmp_path, write_gif):
+        mood = tmp_path / '5_4' / 'chill'
+        mood.mkdir(parents=True)
+        write_gif(mood / 'a.gif', [(255, 0, 0), (0, 255, 0)])
+        write_gif(mood / 'b.gif', [(0, 0, 255), (0, 255, 0)])
+        resolution = playback._resolution_from(tmp_path / '5_4')
+        assert resolution == (5, 4)
+        assert playback.compile_tree(tmp_path, resolution, 'scale') == 2
+        assert playback.compile_tree(tmp_path, resolution, 'scale') == 0
@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import text_queue
+
+LETTERS = Path(__file__).parent.parent / 'letter'
+
+
+@pytest.fixture(autouse=True)
+def letters(monkeypatch, tmp_path):
+    monkeypatch.setattr(text_queue, 'LETTERS', LETTERS)
+    monkeypatch.setattr(text_queue, 'queue_db', str(tmp_path / 'text_queue.db'))
+    monkeypatch.setattr(text_queue, 'legacy_txt', str(tmp_path / 'text_queue.txt'))
+    for cached in (text_queue._queue, text_queue._atlas, text_queue.rasterize):
+        cached.cache_clear()
+    yield
+    for cached in (text_queue._queue, text_queue._atlas, text_queue.rasterize):
+        cached.cache_clear()
+
+
+class TestRasterize:
+    def test_glyphs_follow_each_other(self):
+        a = text_queue.rasterize('A')
+        b = text_queue.rasterize('B')
+        ab = text_queue.rasterize('AB')
+        assert ab.shape == (a.shape[0], a.shape[1] + b.shape[1])
+        assert (ab[:, :a.shape[1]] == a).all()
+        assert not a[0].any()  # blank top row
+
+    def test_space_and_unknown_characters(self):
+        # A space advances 3 columns and an unknown character 1, as the dot lists did
+        assert text_queue.rasterize(' ').shape[1] == 3
+        assert text_queue.rasterize('  ').shape[1] == 6
+        assert text_queue.rasterize('一').shape[1] == 1
+        assert not text_queue.rasterize('一').any()
+
+    def test_memoized_and_read_only(self):
+        bitmap = text_queue.rasterize('Hi')
+        assert text_queue.rasterize('Hi') is bitmap
+        assert not bitmap.flags.writeable
+
+
+class TestQueue:
+    def test_put_and_pop(self):
+        text_queue.put('Hi')
+        text_queue.put('')
+        assert text_queue.has_items()
+        assert (text_queue.pop() == text_queue.rasterize('Hi')).all()
+        assert not text_queue.has_items()
+
+    def test_put_reports_the_wait(self):
+        assert text_queue.put('Hi', 'alice') == 0
+        assert text_queue.put('Hi', 'alice') == 0  # coalesced
+        assert text_queue.put('Yo', 'bob') == pytest.approx(text_queue.scroll_seconds('Hi'))
+        assert text_queue.size() == 2
+
+    def test_empty(self):
+        assert not text_queue.has_items()
+        assert text_queue.pop() is None
+
+    def test_pops_legacy_text_file_items(self):
+        with open(text_queue.legacy_txt, 'w') as f:
+            f.write(json.dumps([[0, 1], [2, 3]]) + '\n')
+            f.write(json.dumps('Hi') + '\n')
+        bitmap = text_queue.pop()
+        assert bitmap[1, 0] and bitmap[3, 2] and bitmap.sum() == 2
+        assert (text_queue.pop() == text_queue.rasterize('Hi')).all()
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import playback
+from frame_cache import resize
+from variants import VariantStore, closest_library
+
+
+# ---------------------------------------------------------------------------
+# resize modes
+# ---------------------------------------------------------------------------
+
+class TestResize:
+    def test_scale_stretches(self):
+        image = resize(Image.new('RGB', (10, 2), (200, 0, 0)), (5, 4), 'scale')
+        assert image.size == (5, 4)
+        assert np.asarray(image)[3, 4].tolist() == [200, 0, 0]
+
+    def test_fit_pads_with_black(self):
+        image = np.asarray(resize(Image.new('RGB', (10, 2), (200, 0, 0)), (5, 4), 'fit'))
+        assert image.shape == (4, 5, 3)
+        assert image[0, 2].tolist() == [0, 0, 0]
+        assert image[1, 2].tolist() == [200, 0, 0]
+        assert image[3, 2].tolist() == [0, 0, 0]
+
+    def test_cut_keeps_centre(self):
+        source = Image.new('RGB', (7, 4))
+        source.putpixel((3, 2), (0, 0, 255))
+        image = np.asarray(resize(source, (5, 4), 'cut'))
+        assert image[2, 2].tolist() == [0, 0, 255]
+
+
+# ---------------------------------------------------------------------------
+# VariantStore
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def store(tmp_path):
+    executor = ThreadPoolExecutor(max_workers=1)
+    store = VariantStore(tmp_path / 'cache', (5, 4), 'scale', executor=executor)
+    yield store
+    executor.shutdown(wait=True)
+
+
+class TestVariantStore:
+    def test_builds_on_first_lookup(self, tmp_path, store, write_gif):
+        gif = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], size=(10, 8))
+        assert store.lookup(gif) is None
+        store._executor.shutdown(wait=True)
+        variant = store.lookup(gif)
+        assert variant is not None
+        assert store.is_ready(gif)
+        assert playback.load(variant).frames.shape == (2, 4, 5, 3)
+
+    def test_key_follows_content(self, tmp_path, store, write_gif):
+        a = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], size=(10, 8))
+        b = write_gif(tmp_path / 'b.gif', [(255, 0, 0), (0, 255, 0)], size=(10, 8))
+        c = write_gif(tmp_path / 'c.gif', [(0, 0, 255), (0, 255, 0)], size=(10, 8))
+        assert store._key(a) == store._key(b)
+        assert store._key(a) != store._key(c)
+
+    def test_not_ready_before_lookup(self, tmp_path, store, write_gif):
+        gif = write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0)], size=(10, 8))
+        assert not store.is_ready(gif)
+
+
+def test_closest_library_prefers_aspect_then_size(tmp_path):
+    for name in ['20_15', '25_12', '50_24', 'scaled']:
+        (tmp_path / name).mkdir()
+    assert closest_library(tmp_path, (100, 48)).name == '50_24'
+    assert closest_library(tmp_path, (12, 9)).name == '20_15'
@@ -0,0 +1,57 @@
+import sys
+import time
+
+import pytest
+
+import ingest
+import video
+
+
+@pytest.fixture
+def decoder(tmp_path):
+    """Stand-in for FFmpeg writing frames numbered 0, 1, ... of 2x1 pixels, as many as the input file says."""
+    script = tmp_path / 'ffmpeg'
+    script.write_text(f'''#!{sys.executable}
+import sys
+count = int(open(sys.argv[sys.argv.index('-i') + 1]).read())
+for i in range(count):
+    sys.stdout.buffer.write(bytes([i % 256]) * 6)
+    sys.stdout.flush()
+''')
+    script.chmod(0o755)
+
+    def make(count):
+        source = tmp_path / f'{count}.mp4'
+        source.write_text(str(count))
+        return str(source), str(script)
+    return make
+
+
+class TestVideoStream:
+    def test_yields_every_frame(self, decoder):
+        source, executable = decoder(20)
+        with video.VideoStream(source, (2, 1), buffer_frames=3, executable=executable) as stream:
+            frames = list(stream)
+        assert [frame[0, 0, 0] for frame in frames] == list(range(20))
+        assert frames[0].shape == (1, 2, 3)
+
+    def test_close_early_stops_the_decoder(self, decoder):
+        source, executable = decoder(100000)
+        stream = video.VideoStream(source, (2, 1), buffer_frames=2, executable=executable)
+        assert next(iter(stream))[0, 0, 0] == 0
+        started = time.monotonic()
+        stream.close()
+        assert time.monotonic() - started < 5
+        assert stream._process.returncode is not None
+
+    def test_missing_decoder(self, tmp_path):
+        with pytest.raises(OSError):
+            video.VideoStream(tmp_path / 'a.mp4', (2, 1), executable=str(tmp_path / 'nothing'))
+
+
+def test_stream_mode_stores_the_video(tmp_path):
+    ingestor = ingest.Ingestor(tmp_path / 'gifs', (25, 12), ingest.MediaCache(tmp_path / 'cache', 1 << 20),
+                               executor=object())
+    out = ingestor.submit(b'\0\0\0\x18ftypmp42', stream_video=True).result(0)
+    assert video.is_video(out) and open(out, 'rb').read() == b'\0\0\0\x18ftypmp42'
+    assert ingestor.jobs == 0
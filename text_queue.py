@@ -1,83 +1,107 @@
+import functools
 import json
 import logging
 from pathlib import Path
-from typing import Any, cast
 
+import numpy as np
 from PIL import Image
-from filelock import FileLock
 
-from config import Constants
+import notify
+from config import Constants, Main_Options as Options, settings
+from durable_queue import DurableQueue
+from overlay import dots_to_bitmap
 
-queue_txt = f"{Constants.work_dir}/text_queue.txt"
-lock = FileLock(f"{queue_txt}.lock")
+queue_db = f"{Constants.work_dir}/text_queue.db"
+legacy_txt = f"{Constants.work_dir}/text_queue.txt"
 
 logger = logging.getLogger(__name__)
 LETTERS = Path(f'{Constants.work_dir}/letter')
 
+_has_items = False
+
+
+@functools.cache
+def _queue() -> DurableQueue:
+    return DurableQueue(queue_db, legacy=legacy_txt)
+
 
 def setup():
-    open(queue_txt, "a").write("")
-
-
-def put(text: str):
-    def add_char_coord(char, width, t_char):
-        if ord(char) == 32:
-            return t_char, width + 3
-        char_dict = get_coords(char)
-        if char_dict:
-            for coords in char_dict['dots']:
-                t_char.append([coords[0] + width, coords[1]])
-            width += char_dict['size'][0]
-        return t_char, width + 1
-
-    logger.info('Adding "%s" to text queue', text)
-    text_matrix: list[list[int]] = []
-    text_width = 0
-    for character in text:
-        text_matrix, text_width = add_char_coord(character, text_width, text_matrix)
-    if text_width > 0:
-        with lock:
-            with open(queue_txt, 'a') as f:
-                json.dump(text_matrix, f)
-                f.write('\n')
-
-
-def has_items():
-    # TODO check empty file
-    with open(queue_txt, 'r') as fin:
-        return fin.readline()
-
-
-def pop():
-    with lock:
-        with open(queue_txt, 'r+') as f:  # open file in read / write mode
-            first_line = f.readline()  # read the first line and throw it out
-            data = f.read()  # read the rest
-            f.seek(0)  # set the cursor to the top of the file
-            f.write(data)  # write the data back
-            f.truncate()  # set the file size to the current size
-            return json.loads(first_line)
-
-
-def dotting(path: Path):
-    img = Image.open(path)
-    dots = img.convert('L')
-    letter_matrix: dict[str, Any] = {'dots': []}
-    furthest_x = 0
-    for x in range(img.size[0]):
-        for y in range(img.size[1]):
-            g_scale_value = cast(int, dots.getpixel((x, y)))  # mode 'L' always returns int
-            if g_scale_value > 100:
-                furthest_x = x
-                letter_matrix['dots'].append((x, y + 1))
-
-    letter_matrix['size'] = (furthest_x, dots.size[1])
-    return letter_matrix
-
-
-def get_coords(char: str):
-    try:
-        return dotting(LETTERS.joinpath('thin4_' + '{:05d}'.format(ord(char)) + '.png'))
-    except FileNotFoundError:
-        logger.info('Letter not found')
+    _queue()
+
+
+def scroll_seconds(text: str) -> float:
+    """How long text takes to scroll across the display at the current speed."""
+    return (rasterize(text).shape[1] + settings.display_resolution[0]) / Options.scroll_speed
+
+
+def put(text: str, sender: str = '') -> float:
+    """Queue text for the overlay and return the estimated seconds until it starts scrolling.
+
+    The same text from the same sender waiting already is not queued twice. Raises
+    QueueFull when sender or the queue has as many texts waiting as Options allow.
+    """
+    logger.info('Adding "%s" from %r to text queue', text, sender)
+    if not text:
+        return 0
+    eta = _queue().put(json.dumps(text), sender, scroll_seconds(text), Options.queue_per_sender,
+                       Options.queue_total, coalesce=True)
+    notify.notify('text')
+    return eta
+
+
+def has_items() -> bool:
+    """Whether text is queued. The database is only asked after a change was notified."""
+    global _has_items
+    if notify.changed('text'):
+        _has_items = _queue().has_items()
+    return _has_items
+
+
+def size() -> int:
+    return len(_queue())
+
+
+def pop() -> np.ndarray | None:
+    """Take the next text off the queue as a boolean (rows, columns) bitmap."""
+    line = _queue().take()
+    notify.notify('text')
+    if line is None:
         return None
+    item = json.loads(line)
+    if isinstance(item, list):  # dot coordinates queued by an older version
+        return dots_to_bitmap(item)
+    return rasterize(item)
+
+
+@functools.cache
+def _atlas() -> dict[str, np.ndarray]:
+    """Every glyph as a bitmap block with one blank row on top, decoded once per process."""
+    lit = {}
+    for path in LETTERS.glob('thin4_*.png'):
+        with Image.open(path) as img:
+            pixels = np.asarray(img.convert('L')) > 100
+        columns = np.flatnonzero(pixels.any(axis=0))
+        lit[chr(int(path.stem[len('thin4_'):]))] = pixels[:, :columns[-1] + 1 if columns.size else 1]
+    height = max((pixels.shape[0] for pixels in lit.values()), default=0) + 1
+    atlas = {' ': np.zeros((height, 3), dtype=bool), '': np.zeros((height, 1), dtype=bool)}
+    for char, pixels in lit.items():
+        block = np.zeros((height, pixels.shape[1]), dtype=bool)
+        block[1:1 + pixels.shape[0]] = pixels
+        atlas[char] = block
+    logger.info('Loaded %d glyphs from %s', len(lit), LETTERS)
+    return atlas
+
+
+@functools.lru_cache(maxsize=128)
+def rasterize(text: str) -> np.ndarray:
+    """Bitmap of text, one glyph after the other; memoized, so the result is read only."""
+    atlas = _atlas()
+    blocks = []
+    for char in text:
+        if char not in atlas:
+            logger.info('Letter not found')
+            char = ''
+        blocks.append(atlas[char])
+    bitmap = np.concatenate(blocks, axis=1) if blocks else atlas[''][:, :0]
+    bitmap.flags.writeable = False
+    return bitmap
@@ -1,45 +1,75 @@
+import functools
 import logging
-import os
 
-from filelock import FileLock
+import notify
+import playback
+import video
+from config import Constants, Main_Options as Options
+from durable_queue import DurableQueue
+from frame_cache import DEFAULT_GIF_DURATION_MS, duration_ms
 
-from config import Constants
-
-queue_txt = f"{Constants.work_dir}/queue.txt"
-lock = FileLock(f"{queue_txt}.lock")
+queue_db = f"{Constants.work_dir}/queue.db"
+legacy_txt = f"{Constants.work_dir}/queue.txt"
 
 logger = logging.getLogger("blinky.queue")
-logging.getLogger("filelock").setLevel(logging.WARN)
+
+# How long GifPlayer shows a queued file: a still for 50 frames, an animation for at least
+# one pass of its loop duration
+STILL_SECONDS = 50 * DEFAULT_GIF_DURATION_MS / 1000
+MIN_ANIMATION_SECONDS = 0.5
+
+_has_items = False
+
+
+@functools.cache
+def _queue() -> DurableQueue:
+    return DurableQueue(queue_db, legacy=legacy_txt)
 
 
 def setup() -> None:
-    with open(queue_txt, "a", encoding='utf-8') as fl:
-        fl.write("")
+    _queue()
 
 
-def mark_ready(path: str) -> None:
-    with lock:
-        logger.info("Queuing: %s", path)
-        with open(queue_txt, "a", encoding='utf-8') as fl:
-            fl.write(path + "\n")
+def play_seconds(path: str) -> float:
+    if video.is_video(path):
+        seconds = video.duration_seconds(path)
+        return STILL_SECONDS if seconds is None else max(seconds, MIN_ANIMATION_SECONDS)
+    if path.endswith(playback.SUFFIX):
+        animation = playback.load(path)
+        duration = None if animation.still else float(animation.durations.sum())
+    else:
+        duration = duration_ms(path)
+    if duration is None:
+        return STILL_SECONDS
+    return max(duration / 1000, MIN_ANIMATION_SECONDS)
+
+
+def mark_ready(path: str, sender: str = '') -> float:
+    """Queue a GIF or playback file for the display and return the estimated seconds until it plays.
+
+    Raises QueueFull when sender or the queue has as many GIFs waiting as Options allow.
+    """
+    logger.info("Queuing: %s from %r", path, sender)
+    eta = _queue().put(path, sender, play_seconds(path), Options.queue_per_sender, Options.queue_total)
+    notify.notify('gifs')
+    return eta
 
 
 def has_items() -> bool:
-    if os.stat(queue_txt).st_size == 0:
-        return False
-    return True
+    """Whether GIFs are queued. The database is only asked after a change was notified."""
+    global _has_items
+    if notify.changed('gifs'):
+        _has_items = _queue().has_items()
+    return _has_items
+
+
+def size() -> int:
+    return len(_queue())
 
 
 def take():
-    with lock:
-        if not has_items():
-            logger.info('Queue is empty')
-            return None
-        with open(queue_txt, 'r', encoding='utf-8') as fin:
-            data = fin.read().splitlines(True)
-        with open(queue_txt, 'w', encoding='utf-8') as fout:
-            if len(data) == 1:
-                fout.write('')
-            else:
-                fout.writelines(data[1:])
-        return data[0].strip()
+    path = _queue().take()
+    notify.notify('gifs')  # look again on the next has_items()
+    if path is None:
+        logger.info('Queue is empty')
+    return path
@@ -0,0 +1,124 @@
+"""Panel resolution variants of background animations, built on demand and cached by content.
+
+When the library has no directory for the configured crate layout, backgrounds from
+another resolution are adapted (fit, cut or scale) by a background worker process and
+stored as playback files under a key derived from the source bytes, the target resolution
+and the resize mode. Changing the layout only costs one build per file, on first use.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Iterable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+
+import playback
+from frame_cache import ResizeMode, decode
+
+logger = logging.getLogger('blinky.variants')
+
+
+def lower_priority() -> None:
+    # Keep the render thread ahead of the builders on a busy Pi
+    os.nice(10)
+
+
+def build_variant(source: str, out: str, resolution: tuple[int, int], mode: ResizeMode) -> str:
+    """Decode source, adapt it to resolution and write it as a playback file. Runs in a worker."""
+    playback.write(out, decode(source, resolution, mode), mode)
+    return out
+
+
+def closest_library(backgrounds_root: str | Path, resolution: tuple[int, int]) -> Path:
+    """The <width>_<height> library whose aspect ratio is closest to resolution, larger ones first on ties."""
+    aspect = resolution[0] / resolution[1]
+    candidates = []
+    for entry in os.scandir(backgrounds_root):
+        width, sep, height = entry.name.partition('_')
+        if entry.is_dir() and sep and width.isdigit() and height.isdigit():
+            w, h = int(width), int(height)
+            candidates.append((abs(w / h - aspect), -w * h, entry.path))
+    if not candidates:
+        raise FileNotFoundError(f'No background library in {backgrounds_root}')
+    return Path(min(candidates)[2])
+
+
+class VariantStore:
+    """Content-keyed cache directory of adapted playback files."""
+
+    def __init__(self, cache_dir: str | Path, resolution: tuple[int, int], mode: ResizeMode = 'scale',
+                 workers: int = 1, executor: Executor | None = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.resolution = resolution
+        self.mode = mode
+        self._keys: dict[str, tuple[int, str]] = {}  # path -> (mtime_ns, key)
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=lower_priority,
+        )
+
+    def _variant_path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}{playback.SUFFIX}'
+
+    def _key(self, path: str) -> str:
+        mtime = os.stat(path).st_mtime_ns
+        known = self._keys.get(path)
+        if known and known[0] == mtime:
+            return known[1]
+        digest = hashlib.sha1(f'{self.resolution[0]}x{self.resolution[1]}:{self.mode}:'
+                              f'{playback.VERSION}:'.encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+        key = digest.hexdigest()
+        self._keys[path] = (mtime, key)
+        return key
+
+    def is_ready(self, path: str) -> bool:
+        """Whether a variant was built, without hashing files that were not looked up yet."""
+        known = self._keys.get(path)
+        return known is not None and self._variant_path(known[1]).exists()
+
+    def lookup(self, path: str) -> Path | None:
+        """The variant for path, or None after scheduling its build."""
+        key = self._key(path)
+        out = self._variant_path(key)
+        if out.exists():
+            return out
+        with self._lock:
+            if key in self._pending:
+                return None
+            logger.info('Building %dx%d variant of %s', *self.resolution, path)
+            future = self._executor.submit(build_variant, path, str(out), self.resolution, self.mode)
+            self._pending[key] = future
+
+        def done(finished: Future[str]) -> None:
+            self._done(key, path, finished)
+
+        # Outside the lock: a build that already finished runs the callback right here
+        future.add_done_callback(done)
+        return None
+
+    def _done(self, key: str, path: str, future: Future[str]) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        if not future.cancelled() and future.exception():
+            logger.error('Building a variant of %s failed: %s', path, future.exception())
+
+    def warm(self, paths: Iterable[str]) -> None:
+        """Hash and schedule builds for paths on a background thread."""
+        def run() -> None:
+            for path in paths:
+                try:
+                    self.lookup(path)
+                except Exception:
+                    logger.exception('Could not schedule a variant of %s', path)
+        threading.Thread(target=run, name='variants_warm', daemon=True).start()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
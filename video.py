@@ -0,0 +1,104 @@
+"""Video decoded by FFmpeg into raw frames at display resolution.
+
+Used by ingest to convert uploads into playback files and, with Options.video_mode
+'stream', by the player to show a queued video while FFmpeg decodes it: the first frame
+is on the wall as soon as it is decoded, and decoding stays at most BUFFER_FRAMES ahead.
+"""
+import logging
+import queue
+import subprocess
+import threading
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger('blinky.video')
+
+# Queued videos keep this suffix; FFmpeg itself goes by the content
+SUFFIX = '.mp4'
+# Frame rate video is sampled at
+FPS = 25
+# Frames decoded ahead of the one on the wall
+BUFFER_FRAMES = 8
+
+
+def is_video(path: str | Path) -> bool:
+    return str(path).endswith(SUFFIX)
+
+
+def output_options(resolution: tuple[int, int]) -> str:
+    """FFmpeg output options for rgb24 frames at resolution and FPS, without audio."""
+    return f'-an -vf fps={FPS},scale={resolution[0]}:{resolution[1]} -f rawvideo -pix_fmt rgb24'
+
+
+def duration_seconds(path: str | Path, executable: str = 'ffprobe') -> float | None:
+    """Length of a video as FFprobe reports it, None when it cannot tell."""
+    try:
+        out = subprocess.run(
+            [executable, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', str(path)],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=10, check=True,
+        ).stdout
+        return float(out)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        logger.warning('Could not get the length of %s', path)
+        return None
+
+
+class VideoStream:
+    """Frames of a video, decoded by an FFmpeg process while they are played.
+
+    A reader thread moves frames from FFmpeg's pipe into a queue of buffer_frames; when
+    the player falls behind, the queue and then the pipe fill up and FFmpeg waits.
+    Iterate for the frames, each shown frame_ms; close() stops FFmpeg early.
+    """
+
+    frame_ms = 1000 // FPS
+
+    def __init__(self, path: str | Path, resolution: tuple[int, int], buffer_frames: int = BUFFER_FRAMES,
+                 executable: str = 'ffmpeg'):
+        width, height = resolution
+        self._shape = (height, width, 3)
+        self._frames: queue.Queue[np.ndarray | None] = queue.Queue(buffer_frames)
+        self._ended = False
+        self._process = subprocess.Popen(
+            [executable, '-hide_banner', '-loglevel', 'error', '-i', str(path),
+             *output_options(resolution).split(), 'pipe:1'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+        )
+        self._reader = threading.Thread(target=self._read, name='video', daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        frame_bytes = self._shape[0] * self._shape[1] * 3
+        stdout = self._process.stdout
+        try:
+            while stdout is not None and len(chunk := stdout.read(frame_bytes)) == frame_bytes:
+                self._frames.put(np.frombuffer(chunk, dtype=np.uint8).reshape(self._shape))
+        finally:
+            self._frames.put(None)
+
+    def __iter__(self):
+        while not self._ended:
+            frame = self._frames.get()
+            if frame is None:
+                self._ended = True
+                return
+            yield frame
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+        # Unblock the reader should it wait for room in the queue
+        while not self._ended:
+            self._ended = self._frames.get() is None
+        self._reader.join()
+        if self._process.stdout is not None:
+            self._process.stdout.close()
+        if self._process.wait():
+            logger.debug('FFmpeg exited with %d', self._process.returncode)
+
+    def __enter__(self) -> 'VideoStream':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()